@@ -0,0 +1,79 @@
+import pandas as pd
+import numpy as np
+from regression import Regression
+
+#Class that measures projection quality over history by walking forward through the dates in a training feature file
+#Each date is predicted with a model trained on all earlier dates, for forwards, defenders, and goalies separately
+#Models are refit incrementally by adding each date's gram matrix to a running total instead of refitting from scratch
+class Backtest:
+    def __init__(self,feature_file,storage=None):
+        self.regression = Regression(feature_file,storage)
+        self.grams = {}
+
+    #Helper function that gets each date's gram matrix for a position, computed once on the union of all features used
+    def get_grams(self,pos,feature_list):
+        if pos not in self.grams or not set(feature_list) <= set(self.grams[pos][0]):
+            features = list(self.grams[pos][0]) if pos in self.grams else []
+            features += [f for f in feature_list if f not in features]
+            self.grams[pos] = (features,)+self.regression.date_grams(pos,features)
+        features,dates,grams = self.grams[pos]
+
+        return dates,self.regression.sub_gram(grams,features,feature_list)
+
+    #Walks forward over the dates and returns a df of each player's projection and actual result on each predicted date
+    #feature_lists is a dict of feature lists for each position (F, D, G), model is 'ols' or 'ridge'
+    #Dates are only predicted once there are min_train_dates earlier dates to train on
+    #incremental False refits with Regression.ols/ridge on each date instead, which is slower but useful to check results
+    def run(self,feature_lists,model='ridge',alpha=1.0,min_train_dates=10,incremental=True):
+        alpha = alpha if model == 'ridge' else 0
+        results = []
+        for pos in feature_lists:
+            feature_list = feature_lists[pos]
+            df = self.regression.features[pos]
+            dates,grams = self.get_grams(pos,feature_list)
+            running = grams[:min_train_dates].sum(axis=0)
+            for i in range(min_train_dates,len(dates)):
+                test = df.xs(dates[i],level='date',drop_level=False)
+                if incremental:
+                    coef,intercept = self.regression.solve_gram(running,alpha)
+                    pred = test[feature_list].to_numpy(dtype='float64')@coef+intercept
+                else:
+                    if model == 'ridge':
+                        fit = self.regression.ridge(pos,feature_list,dates[i],alpha=alpha)
+                    else:
+                        fit = self.regression.ols(pos,feature_list,dates[i])
+                    pred = fit.predict(test[feature_list])
+                running = running+grams[i]
+                res = test[['FP/60','FP','value','mean_TOI','salary']].copy()
+                res['pos'] = pos
+                res['proj_FP/60'] = pred
+                results.append(res)
+
+        results = pd.concat(results)
+        results['proj_FP'] = results['proj_FP/60']*results['mean_TOI']/60
+        results['proj_value'] = results['proj_FP']/results['salary']*1000
+
+        return results
+
+    #Summarizes backtest results by position and overall
+    #MAE and RMSE of FP and value, and the mean of each date's rank correlation between projected and actual FP and value
+    def summary(self,results):
+        rows = {}
+        for pos,df in list(results.groupby('pos'))+[('All',results)]:
+            row = {}
+            for stat in ['FP','value']:
+                err = df['proj_'+stat]-df[stat]
+                row[f'{stat}_MAE'] = err.abs().mean()
+                row[f'{stat}_RMSE'] = np.sqrt((err**2).mean())
+                row[f'{stat}_rank_corr'] = df.groupby(level='date').apply(lambda x: x[stat].corr(x['proj_'+stat],method='spearman')).mean()
+            row['n'] = len(df)
+            rows[pos] = row
+
+        return pd.DataFrame(rows).T
+
+    #Backtests several sets of feature lists and returns their summaries stacked into one df for comparison
+    #candidates is a dict of names to dicts of feature lists for each position
+    def compare(self,candidates,model='ridge',alpha=1.0,min_train_dates=10):
+        summaries = {name:self.summary(self.run(candidates[name],model,alpha,min_train_dates)) for name in candidates}
+
+        return pd.concat(summaries,names=['candidate','pos'])
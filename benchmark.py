@@ -0,0 +1,156 @@
+from game_stats import GameStats
+from feature import Feature
+from regression import Regression
+from projection import Projection
+from synthetic import SyntheticSeason
+import pandas as pd
+import datetime as dt
+import tracemalloc
+import argparse
+import platform
+import time
+import json
+import os
+
+#Benchmarks for checking the cost of changes to how stats and features are kept and calculated
+#Results are returned as dicts so they can be written as json and compared between runs or machines
+
+#Measures the memory a Feature keeps for the stats file with and without compact stats
+#and the peak memory of calculating one day's features with actual results on top of that, date defaults to the last date in the stats
+#Returns a dict of the bytes kept after loading, the peak bytes allocated while loading, and the day's peak bytes for each,
+#day_peak_bytes is allocated on top of the loaded stats and day_total_peak_bytes includes them
+def memory_benchmark(stats_file,player_pool_path='player_pool',date=None,stat_args=None):
+    stat_args = stat_args or {'sample_size':30,'regression_scalar':.75}
+    results = {}
+    for name,compact in [('full',False),('compact',True)]:
+        tracemalloc.start()
+        feature = Feature(stats_file,player_pool_path,compact=compact)
+        current,peak = tracemalloc.get_traced_memory()
+        day = date or dt.datetime.strptime(feature.get_stats('S',['TOI']).index.get_level_values('date').max(),'%y_%m_%d').date()
+        tracemalloc.reset_peak()
+        day_start = tracemalloc.get_traced_memory()[0]
+        feature.get_daily_features(day,feature.regressed_mean,True,**stat_args)
+        day_peak = tracemalloc.get_traced_memory()[1]-day_start
+        tracemalloc.stop()
+        results[name] = {'stats_bytes':feature.memory_usage(),'traced_bytes':current,'peak_bytes':peak,'day_peak_bytes':day_peak,'day_total_peak_bytes':day_start+day_peak,'day':day.isoformat()}
+        del feature
+    results['ratio'] = results['compact']['stats_bytes']/results['full']['stats_bytes']
+
+    return results
+
+#Calls func repeat times and returns the fastest time and the last result
+def time_call(func,*args,repeat=3,**kwargs):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args,**kwargs)
+        times.append(time.perf_counter()-start)
+
+    return min(times),result
+
+#Versions and machine info saved with results so runs from different machines aren't compared as if they were the same
+def machine_info():
+    return {
+        'python':platform.python_version(),
+        'pandas':pd.__version__,
+        'platform':platform.platform(),
+        'cpus':os.cpu_count(),
+        'time':dt.datetime.now().isoformat(timespec='seconds'),
+    }
+
+#Times each stage of the pipeline on a synthetic history of max(seasons) seasons written to path
+#Each stage is timed for the last date with only the last n seasons of history for each n in seasons to show how it scales
+#Stats and training features are written for every date once up front, generate False reuses the files already in path
+#Returns a list of records with the stage, number of seasons, fastest time over repeat calls, and rows of history used
+def pipeline_benchmark(path,seasons=(1,2,3,5),repeat=3,workers=1,generate=True,stat_args=None,f_list=None,**synthetic_args):
+    stat_args = stat_args or {'sample_size':30,'regression_scalar':.75}
+    f_list = f_list or ['evSH/60','evBkS/60','evixG/60','lmevixG/60','pplmevixG/60','implied_team_score']
+    d_list = ['evSH/60','evixG/60','pplmevixG/60','implied_team_score']
+    g_list = ['xGSAA/60','implied_opp_score','implied_win_prob']
+    synthetic = SyntheticSeason(path,max(seasons),**synthetic_args)
+    paths = synthetic.paths()
+    stats_file = f"{path}/all_game_stats.csv"
+    feat_file = f"{path}/train_features.csv"
+    bench_path = f"{path}/benchmark"
+    os.makedirs(bench_path,exist_ok=True)
+    records = []
+
+    #Writes the full history once, these are timed as the one time cost of rebuilding everything
+    if generate:
+        seconds,dates = time_call(synthetic.generate,repeat=1)
+        records.append({'stage':'generate','seasons':max(seasons),'seconds':seconds})
+    else:
+        dates = sorted(dt.datetime.strptime(f[:8],'%y_%m_%d').date() for f in os.listdir(paths['ev_path']))
+    date = dates[-1]
+    game_stats = GameStats(paths['ev_path'],paths['pp_path'],paths['pk_path'],paths['goalie_path'],paths['game_path'])
+    if generate:
+        seconds,_ = time_call(game_stats.write_daily_stats_range,paths['stats_path'],dates[0],date,workers,repeat=1)
+        records.append({'stage':'write_daily_stats_range','seasons':max(seasons),'seconds':seconds,'dates':len(dates)})
+        game_stats.write_concated_daily_stats(stats_file,paths['stats_path'],date)
+        feature = Feature(stats_file,paths['player_pool_path'])
+        seconds,_ = time_call(feature.write_daily_features_range,paths['feat_path'],dates[0],dates[-2],feature.regressed_mean,True,rolling=True,workers=workers,repeat=1,**stat_args)
+        records.append({'stage':'write_daily_features_range','seasons':max(seasons),'seconds':seconds,'dates':len(dates)-1})
+        feature.write_concated_daily_features(feat_file,paths['feat_path'],date)
+    train = pd.read_csv(feat_file,float_precision='round_trip')
+
+    for n in sorted(seasons):
+        start = dt.date(synthetic.first_season+max(seasons)-n,10,2)
+        feature = Feature(stats_file,paths['player_pool_path'],start_date=start)
+        history = {'seasons':n,'history_rows':len(feature.stats['S'])+len(feature.stats['G'])}
+        player_pool = feature.get_player_pool(f"{paths['player_pool_path']}/DFF_NHL_cheatsheet_{date.strftime('%Y-%m-%d')}.csv")
+
+        seconds,_ = time_call(game_stats.get_day_stats,date,repeat=repeat)
+        records.append({'stage':'get_day_stats',**history,'seconds':seconds})
+
+        seconds,groups = time_call(feature.get_player_group,date,repeat=repeat)
+        records.append({'stage':'get_player_group',**history,'seconds':seconds})
+
+        seconds,f_stats = time_call(feature.regressed_mean,groups['F'],player_pool['F'],repeat=repeat,**stat_args)
+        records.append({'stage':'regressed_mean',**history,'seconds':seconds})
+
+        player_stats = pd.concat([f_stats,feature.regressed_mean(groups['D'],player_pool['D'],**stat_args)])
+        seconds,_ = time_call(feature.get_line_mate_stat,player_pool,player_stats,'evixG/60',repeat=repeat)
+        records.append({'stage':'get_line_mate_stat',**history,'seconds':seconds})
+
+        seconds,rows = time_call(feature.write_daily_features_file,bench_path,date,feature.regressed_mean,repeat=repeat,**stat_args)
+        records.append({'stage':'write_daily_features_file',**history,'seconds':seconds,'rows':rows})
+
+        #Training features are cut to the same seasons as the stats history
+        train_file = f"{bench_path}/train_features_{n}.csv"
+        train[train['date'] >= start.strftime('%y_%m_%d')].to_csv(train_file,index=False)
+        regression = Regression(train_file)
+        seconds,_ = time_call(regression.ridge,'F',f_list,repeat=repeat)
+        records.append({'stage':'ridge',**history,'seconds':seconds,'train_rows':len(regression.features['F'])})
+
+        projection = Projection(train_file,f"{bench_path}/{date.strftime('%y_%m_%d')}.csv")
+        proj_file = f"{bench_path}/projections_{n}.csv"
+        seconds,_ = time_call(lambda: projection.export_projections(projection.project_ridge(f_list,d_list,g_list),proj_file),repeat=repeat)
+        records.append({'stage':'export_projections',**history,'seconds':seconds})
+
+    return records
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the stats to projection pipeline, results are printed or written as json')
+    sub = parser.add_subparsers(dest='benchmark',required=True)
+    memory = sub.add_parser('memory',help='memory used by Feature stats with and without compact stats')
+    memory.add_argument('stats_file',nargs='?',default='all_game_stats.csv')
+    pipeline = sub.add_parser('pipeline',help='time each pipeline stage on synthetic data as history grows')
+    pipeline.add_argument('path',help='folder the synthetic data is written to')
+    pipeline.add_argument('--seasons',type=int,nargs='+',default=[1,2,3,5])
+    pipeline.add_argument('--teams',type=int,default=31)
+    pipeline.add_argument('--repeat',type=int,default=3)
+    pipeline.add_argument('--workers',type=int,default=1)
+    pipeline.add_argument('--reuse',action='store_true',help='reuse data already written to path instead of generating it')
+    parser.add_argument('--out',help='json file to write results to instead of printing them')
+    args = parser.parse_args()
+
+    if args.benchmark == 'memory':
+        results = memory_benchmark(args.stats_file)
+    else:
+        results = pipeline_benchmark(args.path,args.seasons,args.repeat,args.workers,not args.reuse,n_teams=args.teams)
+    output = {'benchmark':args.benchmark,'machine':machine_info(),'results':results}
+    if args.out:
+        with open(args.out,'w') as f:
+            json.dump(output,f,indent=1)
+    else:
+        print(json.dumps(output,indent=1))
@@ -0,0 +1,130 @@
+import pandas as pd
+import datetime as dt
+import hashlib
+import json
+import os
+from storage import Storage
+
+#Class that keeps one concatenated csv (like all_game_stats.csv) in sync with a folder of daily csvs
+#A manifest next to the concatenated file records the mtime, size, hash, and byte offset of every daily file
+#so only new or changed dates need to be read and written on each update
+#Csv files are appended to in place, columnar formats can't be appended to so they are rewritten when any date changes
+class ConcatStore:
+    def __init__(self,file_name,path_name,index_cols,manifest_file=None,storage=None):
+        self.storage = storage if storage else Storage()
+        self.file_name = self.storage.path(file_name)
+        self.path_name = path_name
+        self.index_cols = index_cols
+        self.manifest_file = manifest_file if manifest_file else f"{self.file_name}.manifest.json"
+
+    #Lists daily files in this storage format that are before the max date, in date order
+    def list_files(self,max_date):
+        return self.storage.list_files(self.path_name,max_date)
+
+    #Helper function that hashes a daily file's contents
+    def file_hash(self,file):
+        with open(f"{self.path_name}/{file}",'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    #Helper function that gets the stat entry used in the manifest for a daily file
+    def file_entry(self,file):
+        st = os.stat(f"{self.path_name}/{file}")
+        return {'mtime':st.st_mtime_ns,'size':st.st_size,'hash':self.file_hash(file)}
+
+    def read_manifest(self):
+        if not (os.path.exists(self.manifest_file) and os.path.exists(self.file_name)):
+            return None
+        with open(self.manifest_file) as f:
+            return json.load(f)
+
+    #Returns a dict of each daily file in the manifest to its hash, empty if there's no manifest
+    def file_hashes(self):
+        manifest = self.read_manifest()
+        return {file:entry['hash'] for file,entry in manifest['files'].items()} if manifest else {}
+
+    def write_manifest(self,manifest):
+        with open(self.manifest_file,'w') as f:
+            json.dump(manifest,f,indent=1)
+
+    #Reads a daily file the same way the full concat does so appended rows are identical to a rewrite
+    def read_file(self,file):
+        return self.storage.read(f"{self.path_name}/{file}").set_index(self.index_cols)
+
+    '''
+    BE CAREFUL WITH THIS FUNCTION
+    WILL OVERWRITE EXISTING FILES
+    '''
+    #Rewrites the concatenated file from every daily file before max date
+    def rebuild(self,max_date=dt.date.today()):
+        files = self.list_files(max_date)
+        df_list = [self.read_file(file) for file in files]
+        columns = pd.concat([df.iloc[:0] for df in df_list]).columns if df_list else []     #union of columns, same as a full concat
+        manifest = {'columns':list(self.index_cols)+list(columns),'files':{}}
+        if self.storage.fmt != 'csv':
+            self.storage.write(pd.concat(df_list),self.file_name)
+            manifest['files'] = {file:self.file_entry(file) for file in files}
+            self.write_manifest(manifest)
+            return files
+        with open(self.file_name,'w',newline='',encoding='utf-8') as f:
+            pd.DataFrame(columns=manifest['columns']).set_index(self.index_cols).to_csv(f)
+            for file,df in zip(files,df_list):
+                manifest['files'][file] = self.file_entry(file)
+                manifest['files'][file]['offset'] = f.tell()
+                df.reindex(columns=columns).to_csv(f,header=False)
+        self.write_manifest(manifest)
+
+        return files
+
+    '''
+    BE CAREFUL WITH THIS FUNCTION
+    WILL OVERWRITE EXISTING FILES
+    '''
+    #Brings the concatenated file up to date with the daily files and returns the list of files that were (re)written
+    #The file is truncated at the earliest new, changed, or removed date and only the dates from there on are appended
+    #Falls back to a full rebuild if there is no manifest or a daily file's columns don't match the concatenated file
+    def update(self,max_date=dt.date.today()):
+        manifest = self.read_manifest()
+        if manifest is None:
+            return self.rebuild(max_date)
+        files = self.list_files(max_date)
+        entries = manifest['files']
+
+        #finds the earliest daily file that is new, changed, or removed since the last update
+        dirty = [file for file in entries if file not in files]
+        for file in files:
+            if file not in entries:
+                dirty.append(file)
+                continue
+            st = os.stat(f"{self.path_name}/{file}")
+            if st.st_mtime_ns != entries[file]['mtime'] or st.st_size != entries[file]['size']:
+                if self.file_hash(file) != entries[file]['hash']:
+                    dirty.append(file)
+                else:
+                    entries[file]['mtime'] = st.st_mtime_ns     #touched but unchanged
+        if not dirty:
+            self.write_manifest(manifest)
+            return []
+        if self.storage.fmt != 'csv':
+            return self.rebuild(max_date)
+        first = min(dirty)
+
+        #reads files to rewrite before touching the concatenated file so a bad file forces a clean rebuild
+        rewrite = [file for file in files if file >= first]
+        df_list = [self.read_file(file) for file in rewrite]
+        if any(list(self.index_cols)+list(df.columns) != manifest['columns'] for df in df_list):
+            return self.rebuild(max_date)
+
+        kept = {file:entries[file] for file in entries if file < first}
+        offset = min([entries[file]['offset'] for file in entries if file >= first],default=None)
+        with open(self.file_name,'r+',newline='',encoding='utf-8') as f:
+            if offset is not None:
+                f.truncate(offset)
+            f.seek(0,os.SEEK_END)
+            for file,df in zip(rewrite,df_list):
+                kept[file] = self.file_entry(file)
+                kept[file]['offset'] = f.tell()
+                df.to_csv(f,header=False)
+        manifest['files'] = kept
+        self.write_manifest(manifest)
+
+        return rewrite
@@ -1,12 +1,31 @@
 from game_stats import GameStats
 from feature import Feature
 from projection import Projection
+from storage import Storage
+from model_cache import ModelCache
+from instrumentation import RunLog
+from player_state import PlayerStateCache
+from concat_store import ConcatStore
+from simulation import Simulation
+import pandas as pd
 import datetime as dt
+import os
 
 #Main driver class that puts all other classes in one package
 #takes all necessary paths and files as arguments to be used in producing projections for the given day
+#storage_format sets how stats and features are stored (csv, parquet, or feather), projections are always exported as csv
+#Fitted models are cached in model_cache_path so they aren't refit until the training features change, or only in memory if it is None
+#Today's stats for every player are saved to player_stats_file so reproject_pool can skip recalculating them, or only kept in memory if it is None
+#Each stage's time, peak memory, rows, and errors are recorded in self.run_log and appended to run_log_file as json lines if it is given
+#Stages named in profile_stages are also run under cProfile with the stats dumped to profile_path
+#track_memory records each stage's peak memory with tracemalloc, it's off by default since tracemalloc slows down every stage
+#Each player's last sample_size games are kept in player_state_file and only updated with yesterday's stats so they aren't regrouped from the whole history,
+#they're rebuilt if a daily stats file they were built from has changed since, and check_player_state compares them to a full recompute each run
+#and rebuilds them if they don't match
+#If sim_path is given, FP distributions from Simulation calibrated to the projections are also exported there
+#Data derived from the raw inputs (the parsed game table) is kept in derived_path, or only in memory if it is None
 class DailyProjection:
-    def __init__(self,ev_path,pp_path,pk_path,goalie_path,game_path,stats_path,stats_file,player_pool_path,feat_path,feat_file,proj_path,date=dt.date.today()):
+    def __init__(self,ev_path,pp_path,pk_path,goalie_path,game_path,stats_path,stats_file,player_pool_path,feat_path,feat_file,proj_path,date=dt.date.today(),storage_format='csv',model_cache_path=None,player_stats_file=None,run_log_file=None,profile_stages=(),profile_path='profiles',player_state_file=None,check_player_state=False,sim_path=None,track_memory=False,derived_path=None):
         self.date = date
         self.prev_date = date-dt.timedelta(days=1)
         self.ev_path = ev_path
@@ -20,45 +39,161 @@ class DailyProjection:
         self.feat_path = feat_path
         self.proj_path = proj_path
         self.feat_file = feat_file
+        self.storage = Storage(storage_format)
+        self.model_cache = ModelCache(model_cache_path)
+        self.player_stats_file = player_stats_file
+        self.player_stats = None
+        self.run_log = RunLog(run_log_file,profile_path,profile_stages,track_memory)
+        self.player_state_file = player_state_file
+        self.check_player_state = check_player_state
+        self.sim_path = sim_path
+        self.derived_path = derived_path
+
+        #Arguments for the stat function and features used by each position's model
+        self.stat_args = {'sample_size':30,'regression_scalar':.75}
+        self.f_list = ['evSH/60','evBkS/60','evixG/60','lmevixG/60','pplmevixG/60','implied_team_score']
+        self.d_list = ['evSH/60','evixG/60','pplmevixG/60','implied_team_score']
+        self.g_list = ['xGSAA/60','implied_opp_score','implied_win_prob']
 
     #Function that exports projections for the day to the given proj_path
     #Also updates stats from previous day so they can be used for future training
+    #Failures of yesterday's stats, yesterday's features, or the projection are logged with their error and the run continues
     def export_todays_projections(self):
         #Computes game stats from the previous day and adds them to master list of stats
-        game_stats = GameStats(self.ev_path,self.pp_path,self.pk_path,self.goalie_path,self.game_path)
-        try:
-            game_stats.write_daily_stats_file(self.stats_path,self.prev_date)
-        except:
-            print('Game Stats Failure')
-        game_stats.write_concated_daily_stats(self.stats_file,self.stats_path)
+        game_stats = GameStats(self.ev_path,self.pp_path,self.pk_path,self.goalie_path,self.game_path,storage=self.storage,derived_path=self.derived_path)
+        with self.run_log.stage('daily_stats',self.prev_date,catch=True) as stage:
+            stage['rows'] = game_stats.write_daily_stats_file(self.stats_path,self.prev_date)
+        with self.run_log.stage('concat_stats') as stage:
+            stage['rows'] = len(game_stats.update_concated_daily_stats(self.stats_file,self.stats_path))
 
         #Adds actual stats from the previous day to the feature file
         #Processes todays feature file
-        feature = Feature(self.stats_file,self.player_pool_path)
-        try:
-            feature.write_daily_features_file(self.feat_path,self.prev_date,feature.regressed_mean,True,sample_size=30,regression_scalar=.75)
-        except:
-            print('Feature Failure')
-        feature.write_concated_daily_features(self.feat_file,self.feat_path,self.date)
-        feature.write_daily_features_file(self.feat_path,self.date,feature.regressed_mean,sample_size=30,regression_scalar=.75)
+        with self.run_log.stage('load_stats'):
+            feature = Feature(self.stats_file,self.player_pool_path,self.storage)
+        if self.player_state_file:
+            with self.run_log.stage('player_state',self.prev_date):
+                feature.use_state_cache(self.update_player_state(feature))
+        with self.run_log.stage('daily_features',self.prev_date,catch=True) as stage:
+            stage['rows'] = feature.write_daily_features_file(self.feat_path,self.prev_date,feature.regressed_mean,True,**self.stat_args)
+        with self.run_log.stage('concat_features') as stage:
+            stage['rows'] = len(feature.update_concated_daily_features(self.feat_file,self.feat_path,self.date))
+        #Stats are calculated for every player so they can be reused if the player pool changes later in the day
+        with self.run_log.stage('player_stats',self.date) as stage:
+            self.save_player_stats(feature.get_player_stats(self.date,feature.regressed_mean,**self.stat_args))
+            stage['rows'] = sum(len(df) for df in self.player_stats.values())
+        with self.run_log.stage('todays_features',self.date) as stage:
+            stage['rows'] = feature.write_daily_features_file(self.feat_path,self.date,feature.regressed_mean,player_stats=self.player_stats,**self.stat_args)
 
         #Calculates projected FP and exports them to the projection path
-        f_list = ['evSH/60','evBkS/60','evixG/60','lmevixG/60','pplmevixG/60','implied_team_score']
-        d_list = ['evSH/60','evixG/60','pplmevixG/60','implied_team_score']
-        g_list = ['xGSAA/60','implied_opp_score','implied_win_prob']
-        projection = Projection(self.feat_file,f"{self.feat_path}/{self.date.strftime('%y_%m_%d')}.csv")
-        projection.export_projections(projection.project_ridge(f_list,d_list,g_list),f"{self.proj_path}/{self.date.strftime('%y_%m_%d')}.csv")
-        try:
-            projection.export_projections(projection.project_ridge(f_list,d_list,g_list),f"{self.proj_path}/{self.date.strftime('%y_%m_%d')}.csv")
-        except:
-            print('Projection Failure')
+        with self.run_log.stage('projection',self.date,catch=True) as stage:
+            projection = Projection(self.feat_file,f"{self.feat_path}/{self.date.strftime('%y_%m_%d')}.csv",self.storage,self.model_cache)
+            proj = projection.engine(self.f_list,self.d_list,self.g_list).project(projection.test_features['A'])
+            proj.to_csv(f"{self.proj_path}/{self.date.strftime('%y_%m_%d')}.csv")
+            stage['rows'] = len(proj)
+        if self.sim_path and stage['status'] == 'ok':
+            with self.run_log.stage('simulation',self.date,catch=True) as stage:
+                simulation = Simulation(self.stats_file,self.player_pool_path,storage=self.storage,**self.stat_args)
+                sim = simulation.export_simulation(self.date,f"{self.sim_path}/{self.date.strftime('%y_%m_%d')}.csv",projections=proj)
+                stage['rows'] = len(sim)
+
+    #Loads the player state cache and adds the daily stats files since it was saved, or builds it from the feature's full stats history
+    #The cache is also rebuilt if any daily stats file in it has changed since it was added, going by the hashes in the stats file's manifest
+    def update_player_state(self,feature):
+        cache = PlayerStateCache(self.player_state_file,feature.stats_list,self.stat_args['sample_size'],self.storage)
+        hashes = ConcatStore(self.stats_file,self.stats_path,['date','team','name','position'],storage=self.storage).file_hashes()
+        if not cache.load() or (cache.last_date() or '') > self.prev_date.strftime('%y_%m_%d'):
+            cache.rebuild(feature.stats,hashes)
+        elif cache.changed_files(hashes):
+            print(f"Player State Files Changed, rebuilding: {cache.changed_files(hashes)}")
+            cache.rebuild(feature.stats,hashes)
+        else:
+            cache.update(self.stats_path,self.prev_date,hashes)
+        if self.check_player_state:
+            check = cache.check(feature.stats,self.prev_date)
+            if not check['ok'].all():
+                print(f"Player State Mismatch, rebuilding:\n{check}")
+                cache.rebuild(feature.stats,hashes)
+        cache.save()
+
+        return cache
+
+    #Keeps today's stats for every player and saves them to the player stats file
+    def save_player_stats(self,player_stats):
+        self.player_stats = player_stats
+        if self.player_stats_file:
+            df = pd.concat(player_stats,names=['pos','name'])
+            df['date'] = self.date.strftime('%y_%m_%d')
+            self.storage.write(df,self.player_stats_file)
+
+    #Gets today's stats for every player from memory, then the player stats file, and only recalculates them from the stats file if neither is from today
+    def load_player_stats(self):
+        if self.player_stats is not None:
+            return self.player_stats
+        if self.player_stats_file and self.storage.exists(self.player_stats_file):
+            df = self.storage.read(self.player_stats_file,float_precision='round_trip')
+            if (df['date']==self.date.strftime('%y_%m_%d')).all():
+                self.player_stats = {pos:group.drop(['pos','date'],axis=1).set_index('name') for pos,group in df.groupby('pos')}
+                return self.player_stats
+        feature = Feature(self.stats_file,self.player_pool_path,self.storage)
+        self.save_player_stats(feature.get_player_stats(self.date,feature.regressed_mean,**self.stat_args))
+
+        return self.player_stats
+
+    #Re-projects today after the player pool file changes from line changes, goalie confirmations, or injuries
+    #Only reloads the player pool and recalculates the pool dependent features (line mates, vegas lines, injuries)
+    #on top of today's cached player stats and cached models, then overwrites today's feature and projection files
+    #engine is an already fitted ProjectionEngine to use instead of reading the training features and loading the models again
+    #Returns a df of the players whose projection changed, with their old and new proj_FP
+    def reproject_pool(self,engine=None):
+        feature = Feature(None,self.player_pool_path,self.storage)
+        feat = feature.get_daily_features(self.date,feature.regressed_mean,player_stats=self.load_player_stats(),**self.stat_args)
+        feat_file = f"{self.feat_path}/{self.date.strftime('%y_%m_%d')}.csv"
+        self.storage.write(feat,feat_file)
+
+        proj_file = f"{self.proj_path}/{self.date.strftime('%y_%m_%d')}.csv"
+        old = pd.read_csv(proj_file) if os.path.exists(proj_file) else None
+        if engine is None:
+            projection = Projection(self.feat_file,feat_file,self.storage,self.model_cache)
+            engine = projection.engine(self.f_list,self.d_list,self.g_list)
+            features = projection.test_features['A']
+        else:
+            features = self.storage.read(feat_file)
+        engine.project(features).to_csv(proj_file)
+
+        return self.projection_changes(old,pd.read_csv(proj_file))
+
+    #Compares two projection dfs and returns players that were added, removed, or had their proj_FP change
+    def projection_changes(self,old,new,tol=1e-9):
+        new = new.set_index('name')['proj_FP'].rename('new_proj_FP')
+        if old is None:
+            old = pd.Series(dtype='float64',name='old_proj_FP')
+        else:
+            old = old.set_index('name')['proj_FP'].rename('old_proj_FP')
+        changes = pd.concat([old,new],axis=1)
+        changes['change'] = changes['new_proj_FP']-changes['old_proj_FP']
+        changes['status'] = 'changed'
+        changes.loc[changes['old_proj_FP'].isna(),'status'] = 'added'
+        changes.loc[changes['new_proj_FP'].isna(),'status'] = 'removed'
+        changes = changes[(changes['status']!='changed') | (changes['change'].abs()>tol)]
+
+        return changes.sort_values('change',key=abs,ascending=False)
 
     #Function that updates all stats and features from a date range in case there is a change to feature or stat calculation
-    def write_stats_and_features(self,start_date=dt.date(2019,10,2),end_date=dt.date.today()-dt.timedelta(days=1)):
-        game_stats = GameStats(self.ev_path,self.pp_path,self.pk_path,self.goalie_path,self.game_path)
-        game_stats.write_daily_stats_range(self.stats_path,start_date,end_date)
-        game_stats.write_concated_daily_stats(self.stats_file,self.stats_path)
-
-        feature = Feature(self.stats_file,self.player_pool_path)
-        feature.write_daily_features_range(self.feat_path,start_date,end_date,feature.regressed_mean,True,sample_size=30,regression_scalar=.75)
-        feature.write_concated_daily_features(self.feat_file,self.feat_path,end_date)
\ No newline at end of file
+    #workers sets how many processes the dates are split across
+    #Each date's stats and features are recorded in the run log along with the totals for each stage
+    #The player state file is deleted since the stats it was built from may have changed, the next daily run rebuilds it
+    def write_stats_and_features(self,start_date=dt.date(2019,10,2),end_date=dt.date.today()-dt.timedelta(days=1),workers=1):
+        game_stats = GameStats(self.ev_path,self.pp_path,self.pk_path,self.goalie_path,self.game_path,storage=self.storage,derived_path=self.derived_path)
+        with self.run_log.stage('stats_range'):
+            game_stats.write_daily_stats_range(self.stats_path,start_date,end_date,workers,self.run_log)
+        with self.run_log.stage('concat_stats'):
+            game_stats.write_concated_daily_stats(self.stats_file,self.stats_path)
+        if self.player_state_file and os.path.exists(self.player_state_file):
+            os.remove(self.player_state_file)
+
+        with self.run_log.stage('load_stats'):
+            feature = Feature(self.stats_file,self.player_pool_path,self.storage)
+        with self.run_log.stage('features_range'):
+            feature.write_daily_features_range(self.feat_path,start_date,end_date,feature.regressed_mean,True,rolling=True,workers=workers,run_log=self.run_log,**self.stat_args)
+        with self.run_log.stage('concat_features'):
+            feature.write_concated_daily_features(self.feat_file,self.feat_path,end_date)
\ No newline at end of file
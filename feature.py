@@ -1,21 +1,95 @@
 import pandas as pd
 import numpy as np
 import datetime as dt
-import os
+from collections.abc import Mapping
+from concat_store import ConcatStore
+from storage import Storage
+from player_state import RollingState,DecayState
+from parallel import map_shared,map_shared_measured
+
+#Class that keeps one compact copy of the stats df and gives position dfs (S, F, D, G) through index masks instead of separate copies
+#Position is stored as a category and float columns that only hold values float32 can store exactly (like goals and shots) are stored as float32
+#Position dfs are built when asked for and have float32 columns cast back to float64, so calculations on them are unchanged
+#rows builds one with only the rows and columns a calculation needs so a day's calculations don't copy the whole position df
+class StatViews(Mapping):
+    def __init__(self,stat_df):
+        self.df = stat_df.astype({'position':'category'})
+        self.float32 = {}
+        for col in self.df.columns:
+            if self.df[col].dtype == 'float64':
+                c = self.df[col].astype('float32')
+                if (c.astype('float64') == self.df[col]).sum() == self.df[col].notna().sum():
+                    self.df[col] = c
+                    self.float32[col] = 'float64'
+        position = self.df['position']
+        self.masks = {
+            'S':(position!='G').to_numpy(),
+            'F':position.isin(['L','C','R']).to_numpy(),
+            'D':(position=='D').to_numpy(),
+            'G':(position=='G').to_numpy(),
+        }
+
+    def __getitem__(self,key):
+        return self.df[self.masks[key]].astype(self.float32)
+
+    #Builds a position df of the given columns for dates up to and including max_date, or only date with the date level dropped like xs
+    #The position mask and dates are applied before float32 columns are cast back, so only the rows and columns used are copied
+    #Dates are compared by their codes in the sorted date level of the index, raises KeyError like xs if there are no rows on date
+    def rows(self,key,columns=None,max_date=None,date=None):
+        mask = self.masks[key]
+        dates = self.df.index.levels[0]
+        codes = self.df.index.codes[0]
+        if max_date is not None:
+            mask = mask & (codes < dates.searchsorted(max_date,side='right'))
+        if date is not None:
+            mask = mask & (codes == dates.get_loc(date)) if date in dates else np.zeros_like(mask)
+            if not mask.any():
+                raise KeyError(date)
+        df = self.df.loc[mask,columns] if columns is not None else self.df[mask]
+        df = df.astype({col:t for col,t in self.float32.items() if col in df.columns})
+
+        return df.droplevel('date') if date is not None else df
+
+    def __iter__(self):
+        return iter(self.masks)
+
+    def __len__(self):
+        return len(self.masks)
+
+    #Bytes used by the stats df and position masks
+    def memory_usage(self):
+        return int(self.df.memory_usage(deep=True).sum()+self.df.index.memory_usage(deep=True)+sum(m.nbytes for m in self.masks.values()))
 
 #Class that takes game stats and converts them into a set of features to be used for linear regression
 #Takes a stat file that contains a players stats for a given day
 #and takes a player pool file that contains the players playing on that day, their lines and power play lines, and vegas implied total
+#Only the stat columns used for features are read, start_date optionally drops older history as it's read
+#stats_file can be None to only build features from already calculated player stats
+#compact keeps the stats in one StatViews instead of a dict of separate position dfs to save memory
 class Feature:
-    def __init__(self,stats_file,player_pool_path):
+    def __init__(self,stats_file,player_pool_path,storage=None,start_date=None,compact=True):
+        self.storage = storage if storage else Storage()
+        self.stats_list = ['TOI','evTOI','evG','evA','evSH','evBkS','evixG','SV','GA','GSAA','xGSAA']
         self.stats = {}
-        stat_df = pd.read_csv(stats_file,low_memory=False).set_index(['date','name'])
-        self.stats['S'] = stat_df[stat_df['position']!='G']
-        self.stats['F'] = stat_df[stat_df['position'].isin(['L','C','R'])]
-        self.stats['D'] = stat_df[stat_df['position']=='D']
-        self.stats['G'] = stat_df[stat_df['position']=='G']
+        if stats_file is not None:
+            columns = ['date','name','position']+self.stats_list+['FP/60','FP']
+            date_range = (start_date.strftime('%y_%m_%d'),'99_99_99') if start_date else None
+            stat_df = self.storage.read(stats_file,columns,date_range).set_index(['date','name'])
+            if compact:
+                self.stats = StatViews(stat_df)
+            else:
+                self.stats['S'] = stat_df[stat_df['position']!='G']
+                self.stats['F'] = stat_df[stat_df['position'].isin(['L','C','R'])]
+                self.stats['D'] = stat_df[stat_df['position']=='D']
+                self.stats['G'] = stat_df[stat_df['position']=='G']
         self.player_pool_path = player_pool_path
-        self.stats_list = ['TOI','evTOI','evG','evA','evSH','evBkS','evixG','SV','GA','GSAA','xGSAA']
+        self.player_state = None
+
+    #Bytes used by the stats kept in memory
+    def memory_usage(self):
+        if isinstance(self.stats,StatViews):
+            return self.stats.memory_usage()
+        return int(sum(df.memory_usage(deep=True).sum()+df.index.memory_usage(deep=True) for df in self.stats.values()))
 
     #reads in player pool file, cleans, and separates by position, returns dict of positions
     def get_player_pool(self,file_name):
@@ -32,12 +106,48 @@ class Feature:
 
         return position_pool
 
+    #Gets a position's stats for the given columns, for dates up to and including max_date or only on date (without the date level)
+    #Compact stats only copy those rows and columns, separate position dfs are sliced the same way
+    def get_stats(self,key,columns,max_date=None,date=None):
+        if isinstance(self.stats,StatViews):
+            return self.stats.rows(key,columns,max_date,date)
+        df = self.stats[key]
+        if max_date is not None:
+            df = df.loc[:max_date]
+        if date is not None:
+            df = df.xs(date)
+
+        return df[columns]
+
     #groups given player pool to be used for stat aggregation functions, returns dict of groups based on position
+    #Only forwards, defenders, and goalies are grouped since stat functions are calculated for each of them separately
+    #If rolling or decay state is in use, returns each position's snapshot of means instead of groups
     def get_player_group(self,date):
-        groups = {key:self.stats[key].loc[:date.strftime('%y_%m_%d')][self.stats_list].dropna().groupby('name') for key in self.stats}
+        if self.player_state is not None:
+            return {key:self.player_state[key].snapshot(date) for key in self.player_state}
+        groups = {key:self.get_stats(key,self.stats_list,max_date=date.strftime('%y_%m_%d')).dropna().groupby('name') for key in ['F','D','G']}
 
         return groups
 
+    #Sorts and groups the stats once and computes last n game means for every player and date with RollingState
+    #Set sample_size to None to go back to regrouping the history for each date
+    def use_rolling(self,sample_size):
+        if sample_size is None:
+            self.player_state = None
+        else:
+            self.player_state = {key:RollingState(self.stats[key],self.stats_list,sample_size) for key in ['F','D','G']}
+
+    #Uses the buffers of a player_state.PlayerStateCache that is up to date for the last n game means instead of the stats history
+    def use_state_cache(self,cache):
+        self.player_state = cache.buffers
+
+    #Same as use_rolling but keeps exponentially decayed means with DecayState for recency_weighted_mean
+    def use_decay(self,half_life):
+        if half_life is None:
+            self.player_state = None
+        else:
+            self.player_state = {key:DecayState(self.stats[key],self.stats_list,half_life) for key in ['F','D','G']}
+
     #Naive regression helper function for regressed mean function
     #If a player's games played is less than the sample size, the league average for the stat is calculated
     #and the rest of his games are simulated using that stat times a scalar to prevent small sample size distorition
@@ -48,79 +158,132 @@ class Feature:
 
         return r_stats
 
+    #Vectorized version of naive_regression that regresses every given player at once
+    #The league average left out for each player is the GP weighted league total minus that player's own contribution
+    #Stats that aren't finite for other players carry into the league average like they do in np.average,
+    #NaN makes it NaN, inf or -inf makes it inf or -inf, and both make it NaN
+    def naive_regression_all(self,players,df,sample_size,regression_scalar):
+        x = df.to_numpy(dtype='float64')
+        w = df['GP'].to_numpy(dtype='float64')
+        wx = x*w[:,None]
+        loc = df.index.get_indexer(players)
+        finite_wx = np.where(np.isfinite(wx),wx,0)
+        league = (finite_wx.sum(axis=0)-finite_wx[loc])/(w.sum()-w[loc])[:,None]
+        others = lambda mask: (mask.sum(axis=0)-mask[loc])>0
+        pos_inf,neg_inf = others(wx==np.inf),others(wx==-np.inf)
+        league[pos_inf] = np.inf
+        league[neg_inf] = -np.inf
+        league[others(np.isnan(wx)) | (pos_inf & neg_inf)] = np.nan
+        gp = w[loc][:,None]
+        #a full sample times an inf league average is NaN, the same as naive_regression
+        with np.errstate(invalid='ignore'):
+            r_stats = (gp*x[loc] + regression_scalar*(sample_size-gp)*league)/sample_size
+
+        return pd.DataFrame(r_stats,index=players,columns=df.columns)
+
     #Returns a df of mean even strength rate stats for players in the given player pool
     #Stats are used from the last n games where n is the sample size
     #Players with fewer games played than the sample size have their stats regressed using the naive regression function
+    #group can also be a rolling state snapshot df that already holds the means and GP
     def regressed_mean(self,group,player_pool,sample_size,regression_scalar):
-        means = group.apply(lambda x: x.iloc[-sample_size:].mean())     #calculates mean stats for a player in last n games
+        if isinstance(group,pd.DataFrame):
+            means = group.drop('GP',axis=1)
+            gp = group['GP']
+        else:
+            means = group.apply(lambda x: x.iloc[-sample_size:].mean())     #calculates mean stats for a player in last n games
+            gp = group.apply(lambda x: len(x.iloc[-sample_size:]))     #calculates games played from a player
+
+        return self.regress_means(means,gp,player_pool,sample_size,regression_scalar)
+
+    #Helper function that turns mean stats into per 60 rates and regresses players in the player pool to the league average
+    #gp is each player's games played, which is the weight of their own stats out of sample_size
+    def regress_means(self,means,gp,player_pool,sample_size,regression_scalar):
         means_per60 = (means.drop(['TOI','evTOI'],axis=1).div(means['evTOI'],axis=0)*60).add_suffix('/60')
-        means_per60['GP'] = group.apply(lambda x: len(x.iloc[-sample_size:]))     #calculates games played from a player
+        means_per60['GP'] = gp
         means_per60['mean_TOI'] = means['TOI']
 
         reg_means = means_per60.join(player_pool[[]],how='inner')     #filters to only include players in player pool
         #Regresses players with GP less than sample size 
-        reg_means = reg_means.index.to_series().apply(lambda x: self.naive_regression(x,means_per60,sample_size,regression_scalar)).drop('GP',axis=1)
+        reg_means = self.naive_regression_all(reg_means.index,means_per60,sample_size,regression_scalar).drop('GP',axis=1)
         
         return reg_means
 
-    #future function that will weight more recent stats more heavily in features
-    def recency_weighted_mean(self,group,player_pool,sample_size,regression_scalar):
-        pass
-
-    #Helper function that removes the given player from a line list created in get line mate stat function
-    def get_line(self,team,line,name,line_list):
-        if pd.notna(line):
-            l = line_list.loc[team,line].copy()
-            l.discard(name)
-            return l
+    #Same as regressed_mean but each player's games are weighted so a game half_life games before their latest counts half as much
+    #Per 60 rates are ratios of decayed sums, so they're weighted by decayed TOI like regressed_mean is by TOI
+    #GP is the sum of a player's weights and players are regressed toward the league average the same as regressed_mean,
+    #with the sample size being the most weight a player can have, 1/(1-decay), so only players with a long history keep their own rates
+    #group can also be a decay state snapshot df that already holds the decayed means and GP
+    #Takes the same sample_size and regression_scalar as regressed_mean, half_life is derived from sample_size unless it is given
+    #sample_size can be None when half_life is given
+    def recency_weighted_mean(self,group,player_pool,sample_size,regression_scalar,half_life=None):
+        decay = .5**(1/self.get_half_life(half_life,sample_size))
+        if isinstance(group,pd.DataFrame):
+            means = group.drop('GP',axis=1)
+            gp = group['GP']
         else:
-            return []
-
-    #Helper function that gets average value of a line's stat
-    def line_mate_avg(self,lm,df,stat):
-        xG = []
-        if not lm:
-            return 0    #If line does not exist, 0 is returned
-        for m in lm:
-            try:
-                xG.append(df.loc[m,stat])
-            except:
-                pass
-        return pd.Series(xG,dtype='float64').mean()
+            weights = lambda x: decay**np.arange(len(x)-1,-1,-1)
+            means = group.apply(lambda x: x.mul(weights(x),axis=0).sum()/weights(x).sum())     #calculates decayed mean stats for a player
+            gp = group.apply(lambda x: weights(x).sum())     #calculates effective games played from a player
+
+        return self.regress_means(means,gp,player_pool,1/(1-decay),regression_scalar)
+
+    #Helper function that gets the half life for recency_weighted_mean, either given or derived from sample_size
+    #so that the most weight a player can have, 1/(1-decay), is sample_size games
+    @staticmethod
+    def get_half_life(half_life=None,sample_size=None):
+        if half_life is not None:
+            return half_life
+        if sample_size is None or sample_size <= 1:
+            raise ValueError('recency_weighted_mean needs a half_life or a sample_size greater than 1')
+        return np.log(.5)/np.log(1-1/sample_size)
+
+    #Helper function that gets the average of a stat over each player's line mates using group sums and counts
+    #rows are the players to calculate for and members are the players that make up the lines, both with team, line, and name columns
+    #Each line's stat sum and count have the player's own value taken out so the player isn't counted as their own line mate
+    #Players without a line or without any line mates get 0 and players whose mates have no stats get NaN
+    def line_mate_avg(self,rows,members,line_col,stat_df,stat):
+        keys = ['team',line_col]
+        vals = stat_df.loc[~stat_df.index.duplicated(),stat]
+        members = members.loc[members[line_col].notna(),keys+['name']].drop_duplicates()
+        members['val'] = members['name'].map(vals)
+        groups = members.groupby(keys)
+        lines = pd.DataFrame({'size':groups.size(),'sum':groups['val'].sum(),'count':groups['val'].count()})
+
+        r = rows[keys+['name']].join(lines,on=keys)
+        in_line = pd.MultiIndex.from_frame(r[keys+['name']]).isin(pd.MultiIndex.from_frame(members[keys+['name']]))
+        own = r['name'].map(vals).where(in_line)
+        mates = r['size'].fillna(0)-in_line
+        mate_sum = r['sum']-own.fillna(0)
+        mate_count = r['count']-own.notna()
+        avg = (mate_sum/mate_count).where(mate_count>0)
+
+        return avg.where(mates>0,0).to_numpy()
 
     #helper function to calulate implied win probability of a game using vegas odds
-    def implied_win_prob(self,imp,ou):
+    #works on single values or whole columns/arrays of implied scores and over unders at once
+    @staticmethod
+    def implied_win_prob(imp,ou):
         p = (imp/(ou-imp))**1.8/(1+(imp/(ou-imp))**1.8)
         return p
 
     #Function that calculates the average value of a line's stat to be used in features
-    def get_line_mate_stat(self,player_pool,stat_df,stat):
+    #pp_unit sets who makes up power play units, 'F' only counts forwards as power play line mates (for both forwards and defenders)
+    #and 'S' counts all skaters, 'F' is the default since that is how the features in train_features.csv were built
+    def get_line_mate_stat(self,player_pool,stat_df,stat,pp_unit='F'):
         #Lines, D partners, and power play lines are calculated using line numbers in player pool df
-        line_mates = player_pool['F'][['team','reg_line','pp_line']].copy().reset_index()     #forwards grouped by team and reg line
-        lines = line_mates.groupby(['team','reg_line'])['name'].apply(set).unstack()
-
-        d_partners = player_pool['D'][['team','reg_line']].copy().reset_index()     #defenders grouped by team and d pair
-        d_pairs = d_partners.groupby(['team','reg_line'])['name'].apply(set).unstack()
-
-        pp_line_mates = player_pool['S'][['team','pp_line']].copy().reset_index()   #all skaters grouped by pp line
-        pp_lines = line_mates.groupby(['team','pp_line'])['name'].apply(set).unstack()
+        line_mates = player_pool['F'][['team','reg_line']].reset_index()     #forwards grouped by team and reg line
+        d_partners = player_pool['D'][['team','reg_line']].reset_index()     #defenders grouped by team and d pair
+        pp_line_mates = player_pool['S'][['team','pp_line']].reset_index()   #all skaters get a power play line mate stat
+        pp_units = player_pool[pp_unit][['team','pp_line']].reset_index()    #players that make up power play units
 
-        #Lines are calculated by get_line function and added as a column to resepective dfs
-        line_mates['mates'] = line_mates.apply(lambda x: self.get_line(x['team'],x['reg_line'],x['name'],lines),axis=1)
-        d_partners['mates'] = d_partners.apply(lambda x: self.get_line(x['team'],x['reg_line'],x['name'],d_pairs),axis=1)
-        pp_line_mates['mates'] = pp_line_mates.apply(lambda x: self.get_line(x['team'],x['pp_line'],x['name'],pp_lines),axis=1)
-        
-        #Averages for line are calculated using line_mate_avg function
-        line_mates[stat] = line_mates.apply(lambda x: self.line_mate_avg(x['mates'],stat_df,stat),axis=1)
-        line_mates = line_mates.set_index('name')
-        d_partners[stat] = d_partners.apply(lambda x: self.line_mate_avg(x['mates'],stat_df,stat),axis=1)
-        d_partners = d_partners.set_index('name')
-        pp_line_mates[stat] = pp_line_mates.apply(lambda x: self.line_mate_avg(x['mates'],stat_df,stat),axis=1)
-        pp_line_mates = pp_line_mates.set_index('name')
+        #Averages for each player's line mates excluding themself
+        line_mates[stat] = self.line_mate_avg(line_mates,line_mates,'reg_line',stat_df,stat)
+        d_partners[stat] = self.line_mate_avg(d_partners,d_partners,'reg_line',stat_df,stat)
+        pp_line_mates[stat] = self.line_mate_avg(pp_line_mates,pp_units,'pp_line',stat_df,stat)
 
         #Calculated stats are put into a df with columns for reg_line/d_pair and pp_line
-        lm = pd.concat([line_mates[[stat]],d_partners[[stat]]]).add_prefix('lm')
-        pplm = pp_line_mates[[stat]].add_prefix('pplm')
+        lm = pd.concat([line_mates.set_index('name')[[stat]],d_partners.set_index('name')[[stat]]]).add_prefix('lm')
+        pplm = pp_line_mates.set_index('name')[[stat]].add_prefix('pplm')
         lm_df = lm.join(pplm)
 
         return lm_df
@@ -135,10 +298,10 @@ class Feature:
         player_pool_list = ['implied_team_score','over_under','position','team','opp','ppg_projection','salary']
         feat = feat.join(player_pool[pos][player_pool_list],how='inner')   #joins imp team score and pos from player pool
         if include_actual:
-            feat = feat.join(self.stats[pos].xs(date.strftime('%y_%m_%d'))[['TOI','FP/60','FP']],how='inner')    #attaches actual FP/60 on the day
+            feat = feat.join(self.get_stats(pos,['TOI','FP/60','FP'],date=date.strftime('%y_%m_%d')),how='inner')    #attaches actual FP/60 on the day
             feat['value'] = feat['FP']/feat['salary']*1000
         #calculates implied win probability from implied score and over under
-        feat['implied_win_prob'] = feat.apply(lambda x: self.implied_win_prob(x['implied_team_score'],x['over_under']),axis=1)
+        feat['implied_win_prob'] = self.implied_win_prob(feat['implied_team_score'],feat['over_under'])
         feat['implied_opp_score'] = feat['over_under'] - feat['implied_team_score']
         feat['date'] = date.strftime('%y_%m_%d')
         feat = feat.reset_index().set_index(['date','name','position','team','opp'])
@@ -150,30 +313,85 @@ class Feature:
     WILL OVERWRITE EXISTING FILES
     '''
 
-    def write_daily_features_file(self,feat_path,date,stat_func,include_actual=False,**func_args):
-        #Calculates player pools and groups
-        player_pool = self.get_player_pool(f"{self.player_pool_path}/DFF_NHL_cheatsheet_{date.strftime('%Y-%m-%d')}.csv")
+    #Calculates stats with the stat function for every player with games before the date instead of only a player pool's players
+    #Returns a dict of positions that can be passed as player_stats to get_daily_features when the player pool changes
+    def get_player_stats(self,date,stat_func,**func_args):
         player_groups = self.get_player_group(date)
-        #Calculates stats for forwards and defenders
-        player_stats = {pos:stat_func(player_groups[pos],player_pool[pos],**func_args) for pos in ['F','D','G']}   
+        player_stats = {}
+        for pos in ['F','D','G']:
+            group = player_groups[pos]
+            names = group.index if isinstance(group,pd.DataFrame) else group.size().index
+            player_stats[pos] = stat_func(group,pd.DataFrame(index=names),**func_args)
+
+        return player_stats
+
+    #Calculates the features df for a date, the player pool is read from the player pool path if not given
+    #player_stats from get_player_stats skips calculating stats, they only get filtered to the players in the pool
+    def get_daily_features(self,date,stat_func,include_actual=False,player_pool=None,player_stats=None,**func_args):
+        if isinstance(stat_func,str):
+            stat_func = getattr(self,stat_func)
+        #Calculates player pools and groups
+        if player_pool is None:
+            player_pool = self.get_player_pool(f"{self.player_pool_path}/DFF_NHL_cheatsheet_{date.strftime('%Y-%m-%d')}.csv")
+        if player_stats is None:
+            player_groups = self.get_player_group(date)
+            #Calculates stats for forwards and defenders
+            player_stats = {pos:stat_func(player_groups[pos],player_pool[pos],**func_args) for pos in ['F','D','G']}
+        else:
+            player_stats = {pos:player_stats[pos].join(player_pool[pos][[]],how='inner') for pos in ['F','D','G']}
         player_stats['S'] = pd.concat([player_stats['F'],player_stats['D']])
         #Calculates all features for forwards and defenders
         feat = {pos:self.get_features(player_pool,player_stats['S'],pos,date,include_actual) for pos in ['F','D']}
         feat['G'] = self.get_features(player_pool,player_stats['G'],'G',date,include_actual)
+
+        return pd.concat(feat.values()).fillna(0)
+
+    #stat_func can also be the name of one of this class's stat functions
+    def write_daily_features_file(self,feat_path,date,stat_func,include_actual=False,player_stats=None,**func_args):
+        feat = self.get_daily_features(date,stat_func,include_actual,player_stats=player_stats,**func_args)
         #Combines features for all skaters and writes to a csv in the given folder
-        pd.concat(feat.values()).fillna(0).to_csv(f"{feat_path}/{date.strftime('%y_%m_%d')}.csv")
+        self.storage.write(feat,f"{feat_path}/{date.strftime('%y_%m_%d')}.csv")
+
+        return len(feat)
 
     #Calculates features for a range of dates and writes corresponding csvs to given file
     #Takes a path name to write to, a start and end date, and a function to calculate stats plus optional arguments that may be used by the function
     #Currently, the only function to use is regressed mean, but others can be coded and used in the future
-    def write_daily_features_range(self,feat_path,start_date,end_date,stat_func,include_actual=False,**func_args):
+    #rolling computes last n game means for all dates in one pass first instead of regrouping the history each date
+    #or for recency_weighted_mean keeps decayed sums that are only updated by each date's games
+    #workers greater than 1 writes the dates in parallel on that many processes that share this object's stats read only
+    #run_log (an instrumentation.RunLog) records the time, memory, rows, and any error of each date
+    #func_args are passed to the stat function, regressed_mean takes sample_size and regression_scalar
+    #and recency_weighted_mean takes the same plus an optional half_life (sample_size can be None if it's given, half_life wins if both are)
+    def write_daily_features_range(self,feat_path,start_date,end_date,stat_func,include_actual=False,rolling=False,workers=1,run_log=None,**func_args):
+        if rolling and getattr(stat_func,'__name__',stat_func) == 'recency_weighted_mean':
+            self.use_decay(self.get_half_life(func_args.get('half_life'),func_args.get('sample_size')))
+        elif rolling:
+            self.use_rolling(func_args['sample_size'])
+        #stat functions of this class are passed to workers by name so the stats aren't pickled with each date
+        if getattr(stat_func,'__self__',None) is self:
+            stat_func = stat_func.__name__
         #loops through dates in the range
-        while start_date <= end_date:
-            try:
-                self.write_daily_features_file(feat_path,start_date,stat_func,include_actual,**func_args)
-            except:
-                pass
-            start_date += dt.timedelta(days=1)
+        dates = [start_date+dt.timedelta(days=i) for i in range((end_date-start_date).days+1)]
+        try:
+            if workers > 1:
+                arg_list = [(feat_path,date,stat_func,include_actual) for date in dates]
+                if run_log:
+                    run_log.add_measured('daily_features',dates,map_shared_measured(self,'write_daily_features_file',arg_list,workers,run_log.track_memory,**func_args))
+                else:
+                    map_shared(self,'write_daily_features_file',arg_list,workers,**func_args)
+                return
+            for date in dates:
+                if run_log:
+                    run_log.measure('daily_features',date,self.write_daily_features_file,feat_path,date,stat_func,include_actual,**func_args)
+                    continue
+                try:
+                    self.write_daily_features_file(feat_path,date,stat_func,include_actual,**func_args)
+                except:
+                    pass
+        finally:
+            if rolling:
+                self.use_rolling(None)
 
     '''
     BE CAREFUL WITH THIS FUNCTION
@@ -193,17 +411,17 @@ class Feature:
             except:
                 pass
             start_date += dt.timedelta(days=1)    
-        pd.concat(df_list).to_csv(file_name)
+        self.storage.write(pd.concat(df_list),file_name)
 
     '''
     BE CAREFUL WITH THIS FUNCTION
     WILL OVERWRITE EXISTING FILES
     '''
     #Also creates one file for all features but uses already calculated daily feature files to avoid recalculation
+    #Rebuilds the whole file in date order, use update_concated_daily_features to only write new or changed dates
     def write_concated_daily_features(self,file_name,path_name,max_date=dt.date.today()):
-        file_list = os.listdir(path_name)
-        df_list = []
-        for file in file_list:
-            if file < max_date.strftime('%y_%m_%d'):
-                df_list.append(pd.read_csv(f"{path_name}/{file}").set_index(['date','name','position']))
-        pd.concat(df_list).to_csv(file_name)
\ No newline at end of file
+        ConcatStore(file_name,path_name,['date','name','position'],storage=self.storage).rebuild(max_date)
+
+    #Incremental version of write_concated_daily_features that appends only dates that are new or changed since the last write
+    def update_concated_daily_features(self,file_name,path_name,max_date=dt.date.today()):
+        return ConcatStore(file_name,path_name,['date','name','position'],storage=self.storage).update(max_date)
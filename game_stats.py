@@ -1,101 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import pandas as pd
 import datetime as dt
-import re
 import os
+from scoring import Scoring
+from concat_store import ConcatStore
+from storage import Storage
+from parallel import map_shared_measured
+
+#Team mascot names used in game_info and the city abbreviations Natural Stat Trick uses for the same teams
+MASCOTS = [
+    'Ducks', 'Coyotes', 'Bruins', 'Sabres', 'Hurricanes', 'Blue Jackets', 'Flames', 'Blackhawks', 'Avalanche', 
+    'Stars', 'Red Wings', 'Oilers', 'Panthers', 'Kings', 'Wild', 'Canadiens', 'Devils', 'Predators',
+    'Islanders', 'Rangers', 'Senators', 'Flyers', 'Penguins', 'Sharks', 'Blues', 'Lightning', 'Maple Leafs',
+    'Canucks', 'Golden Knights', 'Jets', 'Capitals'
+]
+CITIES = [
+    'ANA', 'ARI', 'BOS', 'BUF', 'CAR', 'CBJ', 'CGY', 'CHI', 'COL','DAL', 'DET', 'EDM', 'FLA', 'L.A', 'MIN',
+    'MTL', 'N.J', 'NSH', 'NYI', 'NYR', 'OTT', 'PHI', 'PIT', 'S.J', 'STL', 'T.B', 'TOR', 'VAN', 'VGK', 'WPG', 'WSH'
+]
 
 #Class that writes csv files for relevant stats of each day in given range
 #Can write csv files to path that keeps all dates separate
 #and can concat all dates into one csv given a file name
+#derived_path is a folder for data derived from the raw inputs, like the parsed game table, which is only kept in memory if it is None
 class GameStats:
-    def __init__(self,ev_path,pp_path,pk_path,goalie_path,game_path):
+    def __init__(self,ev_path,pp_path,pk_path,goalie_path,game_path,scoring_table='fanduel',storage=None,derived_path=None):
         self.ev_path = ev_path
         self.pp_path = pp_path
         self.pk_path = pk_path
         self.goalie_path = goalie_path
         self.stats_list = ['Player','TOI','Goals','Total Assists','Shots','Shots Blocked','ixG']
         self.goalie_stats_list = ['Player','Team','TOI','Shots Against','Saves','Goals Against','SV%','GSAA','xG Against']
+        self.scoring = Scoring(scoring_table)
+        self.storage = storage if storage else Storage()
+        self.derived_path = derived_path
 
         #Series used to map team mascot names to city abbreviations used in the goalie wins df
-        mas = [
-            'Ducks', 'Coyotes', 'Bruins', 'Sabres', 'Hurricanes', 'Blue Jackets', 'Flames', 'Blackhawks', 'Avalanche', 
-            'Stars', 'Red Wings', 'Oilers', 'Panthers', 'Kings', 'Wild', 'Canadiens', 'Devils', 'Predators',
-            'Islanders', 'Rangers', 'Senators', 'Flyers', 'Penguins', 'Sharks', 'Blues', 'Lightning', 'Maple Leafs',
-            'Canucks', 'Golden Knights', 'Jets', 'Capitals'
-        ]
-        cit = [
-            'ANA', 'ARI', 'BOS', 'BUF', 'CAR', 'CBJ', 'CGY', 'CHI', 'COL','DAL', 'DET', 'EDM', 'FLA', 'L.A', 'MIN',
-            'MTL', 'N.J', 'NSH', 'NYI', 'NYR', 'OTT', 'PHI', 'PIT', 'S.J', 'STL', 'T.B', 'TOR', 'VAN', 'VGK', 'WPG', 'WSH'
-        ]
-        team_map = pd.Series(cit,mas)
+        self.team_map = pd.Series(CITIES,MASCOTS)
         
         #dataframe with info for goalie wins and shutouts to be used in FP calculations
-        self.goalie_wins = self.get_goalie_wins(game_path,team_map)
+        self.game_parse_errors = None
+        self.goalie_wins = self.get_goalie_wins(game_path,self.team_map)
 
     #reads in stats from Natural Stat Trick and outputs a clean dataframe with relevant data
     def get_day_stats(self,date):
+        return self.combine_day_files({date:self.read_day_files(date)})
+
+    #File names of the ev, pp, pk, and goalie stats for a date
+    def day_files(self,date):
+        d = date.strftime('%y_%m_%d')
+        return {'ev':f"{self.ev_path}/{d}.csv",'pp':f"{self.pp_path}/{d}.csv",'pk':f"{self.pk_path}/{d}.csv",'goalie':f"{self.goalie_path}/{d}.csv"}
+
+    #Reads a date's NST files with only the columns that are used and explicit dtypes so nothing else is parsed or type checked
+    #SV% is left to be inferred since NST writes '-' for goalies without shots against and it's kept as written
+    def read_day_files(self,date):
+        files = self.day_files(date)
+        skater_cols = self.stats_list
+        dtypes = {'Player':'str','Team':'str','Position':'str','TOI':'float64','Goals':'float64','Total Assists':'float64','Shots':'float64',
+                  'Shots Blocked':'float64','ixG':'float64','Shots Against':'float64','Saves':'float64','Goals Against':'float64',
+                  'GSAA':'float64','xG Against':'float64'}
+        day = {}
+        day['ev'] = pd.read_csv(files['ev'],usecols=['Team','Position']+skater_cols,dtype=dtypes)[['Team','Position']+skater_cols]
+        day['pp'] = pd.read_csv(files['pp'],usecols=skater_cols,dtype=dtypes)[skater_cols]
+        day['pk'] = pd.read_csv(files['pk'],usecols=skater_cols,dtype=dtypes)[skater_cols]
+        day['goalie'] = pd.read_csv(files['goalie'],usecols=self.goalie_stats_list,dtype=dtypes)[self.goalie_stats_list]
+
+        return day
+
+    #Reads the NST files for many dates on a pool of threads
+    #Returns a dict of each date's files from read_day_files, a dict of dates missing any of their files with the missing file names,
+    #and a dict of dates whose files couldn't be read with the error
+    def load_day_files(self,dates,threads=8):
+        missing = {}
+        for date in dates:
+            files = [f for f in self.day_files(date).values() if not os.path.exists(f)]
+            if files:
+                missing[date] = files
+        with ThreadPoolExecutor(threads) as pool:
+            futures = {date:pool.submit(self.read_day_files,date) for date in dates if date not in missing}
+        days = {}
+        errors = {}
+        for date,future in futures.items():
+            try:
+                days[date] = future.result()
+            except Exception as e:
+                errors[date] = e
+
+        return days,missing,errors
+
+    #Combines the NST files of any number of dates (from read_day_files or load_day_files) into one stats df
+    #The strengths of every date are merged in one outer merge keyed on date and player, then scored together
+    def combine_day_files(self,days):
         stats_list_rename = pd.Series(['name','TOI','G','A','SH','BkS','ixG'],self.stats_list)
         goalie_stats_list_rename = pd.Series(['name','Team','TOI','SA','SV','GA','SV%','GSAA','xGA'],self.goalie_stats_list)
+        dates = {date:date.strftime('%y_%m_%d') for date in days}
 
-        #reads stats from separate paths giving game stats for even strength, power play, and penalty kill
-        ev = pd.read_csv(f"{self.ev_path}/{date.strftime('%y_%m_%d')}.csv")[['Team','Position']+self.stats_list].rename(columns='ev'+stats_list_rename.drop('Player'))
-        pp = pd.read_csv(f"{self.pp_path}/{date.strftime('%y_%m_%d')}.csv")[self.stats_list].rename(columns='pp'+stats_list_rename.drop('Player'))
-        pk = pd.read_csv(f"{self.pk_path}/{date.strftime('%y_%m_%d')}.csv")[self.stats_list].rename(columns='pk'+stats_list_rename.drop('Player'))
-        gs = pd.read_csv(f"{self.goalie_path}/{date.strftime('%y_%m_%d')}.csv")[self.goalie_stats_list].rename(columns=goalie_stats_list_rename.drop('Player'))
+        #stacks each strength for all dates with a date column to merge on
+        strength = {}
+        for key in ['ev','pp','pk','goalie']:
+            strength[key] = pd.concat([days[date][key].assign(date=dates[date]) for date in days],ignore_index=True)
+        ev = strength['ev'].rename(columns='ev'+stats_list_rename.drop('Player'))
+        pp = strength['pp'].rename(columns='pp'+stats_list_rename.drop('Player'))
+        pk = strength['pk'].rename(columns='pk'+stats_list_rename.drop('Player'))
+        gs = strength['goalie'].rename(columns=goalie_stats_list_rename.drop('Player'))
 
         #combines separate dfs into one df with all relevant stats, sets index
-        stats = ev.merge(pp,on='Player',how='outer')
-        stats = stats.merge(pk,on='Player',how='outer')
-        stats['date'] = date.strftime('%y_%m_%d')
+        stats = ev.merge(pp,on=['date','Player'],how='outer')
+        stats = stats.merge(pk,on=['date','Player'],how='outer')
         stats = stats.fillna(0).rename(columns={'Team':'team','Player':'name','Position':'position'}).set_index(['date','team','name','position'])
         goalie_stats = gs.rename(columns={'Team':'team','Player':'name'})
-        goalie_stats['date'] = date.strftime('%y_%m_%d')
         goalie_stats['position'] = 'G'
 
-        #calculates fantasy points with helper functions
-        stats['evFP'] = stats.apply(lambda x: self.ev_fp(x['evG'],x['evA'],x['evSH'],x['evBkS']),axis=1)
-        stats['ppFP'] = stats.apply(lambda x: self.pp_fp(x['ppG'],x['ppA'],x['ppSH'],x['ppBkS']),axis=1)
-        stats['pkFP'] = stats.apply(lambda x: self.pk_fp(x['pkG'],x['pkA'],x['pkSH'],x['pkBkS']),axis=1)
-        stats['TOI'] = stats['evTOI']+stats['ppTOI']+stats['pkTOI']
-        stats['FP'] = stats['evFP']+stats['ppFP']+stats['pkFP']
-        stats['FP/60'] = stats['FP']/stats['TOI']*60
+        #calculates fantasy points for whole columns using the scoring table
+        stats = self.scoring.score_skaters(stats)
 
         #calculates FP for goalies
         goalie_stats['xGSAA'] = goalie_stats['xGA']-goalie_stats['GA']
-        goalie_stats = goalie_stats.merge(self.goalie_wins[['win','SO']],on=['date','team']).set_index(['date','team','name','position'])
-        goalie_stats['FP'] = goalie_stats.apply(lambda x: self.goalie_fp(x['SV'],x['GA'],x['win'],x['SO']),axis=1)
-        goalie_stats['FP/60'] = goalie_stats['FP']/goalie_stats['TOI']*60
+        merged = goalie_stats.merge(self.goalie_wins[['win','SO']],on=['date','team'])
+        if len(merged) < len(goalie_stats):
+            missing = goalie_stats[~goalie_stats.set_index(['date','team']).index.isin(merged.set_index(['date','team']).index)]
+            for d,group in missing.groupby('date'):
+                print(f"Goalie Wins Missing: no game info for {list(group['name'])} ({list(group['team'])}) on {d}")
+        goalie_stats = merged.set_index(['date','team','name','position'])
+        goalie_stats = self.scoring.score_goalies(goalie_stats)
         goalie_stats['evTOI'] = goalie_stats['TOI']
 
-        return pd.concat([stats,goalie_stats]).fillna(0)
+        #each date's skaters are followed by its goalies, the same as one date at a time
+        df = pd.concat([stats,goalie_stats])
+        #SV% is only text on dates with a '-', other dates fill skaters with 0.0 like they would if they were read alone
+        #A batch of only text dates has nothing to fill and its str column can't take 0.0, so it's left to fillna like a single date
+        if df['SV%'].dtype != 'float64':
+            text_dates = [dates[date] for date in days if days[date]['goalie']['SV%'].dtype != 'float64']
+            mask = df['SV%'].isna() & ~df.index.get_level_values('date').isin(text_dates)
+            if mask.any():
+                df.loc[mask,'SV%'] = 0.0
+        df = df.fillna(0)
+        df = df.iloc[df.index.get_level_values('date').argsort(kind='stable')]
 
-    #Processes game info from a string in the game_info dfs
-    #returns dataframe with necessary information to calculate goalie FP
+        return df
+
+    #Gets game info from the game table and returns dataframe with necessary information to calculate goalie FP
     def get_goalie_wins(self,game_path,team_map):
-        hg = pd.read_csv(f"{game_path}/home.csv")['Game'].apply(lambda x: self.game_string_split(x,True))
-        ag = pd.read_csv(f"{game_path}/away.csv")['Game'].apply(lambda x: self.game_string_split(x,False))
-        games = pd.concat([ag,hg]).sort_index()
-        games['GA'] = games['GA'].astype(int)
-        games['GF'] = games['GF'].astype(int)
+        games = self.get_game_table(game_path,team_map)[['GF','opp','GA']].copy()
         games['win'] = (games['GF'] > games['GA']).astype(int)
         games['SO'] = ((games['win']==1) & (games['GA'] == 0)).astype(int)
-        games['team'] = games['Team'].map(team_map)
-        games['opp'] = games['opp'].map(team_map)
-        games = games[['date','team','GF','opp','GA','win','SO']].set_index(['date','team'])
 
         return games
 
-    #Processes string used in the game info dfs with date and score
-    #returns a series with relevant info
-    def game_string_split(self,s,home):
-        d = re.split('(?<![A-Za-z])\s|\s(?![A-Za-z])',s.replace(',',''))
-        d.remove('-')
-        if home:
-            l = ['date','Team','GF','opp','GA']
+    #Loads the parsed game table saved in the derived path and parses only game strings in home.csv and away.csv that aren't in it yet
+    #The table is indexed by date and team and keeps each game's raw string, whether it came from the home file, GF, opp, and GA
+    #Rows that fail to parse are printed, kept in game_parse_errors, and left out of the table so they're retried next time
+    def get_game_table(self,game_path,team_map):
+        table_file = f"{self.derived_path}/game_table.csv" if self.derived_path else None
+        columns = ['Game','home','date','team','GF','opp','GA']
+        if table_file and self.storage.exists(table_file):
+            table = self.storage.read(table_file)
         else:
-            l = ['date','opp','GA','Team','GF']
-        s = pd.Series(d,l)
-        s['date'] = s['date'].replace('-','_')[2:]
-        return s
+            table = pd.DataFrame({col:pd.Series(dtype='str') for col in columns})
+
+        new = []
+        errors = []
+        for file,home in [('away.csv',False),('home.csv',True)]:
+            raw = pd.read_csv(f"{game_path}/{file}",usecols=['Game'])['Game']
+            raw = raw[~raw.isin(table.loc[table['home'].astype(bool)==home,'Game'])].drop_duplicates()
+            if len(raw):
+                parsed,failed = self.parse_games(raw,home,team_map)
+                new.append(parsed)
+                errors.append(failed)
+        if new:
+            table = pd.concat([table]+new if len(table) else new,ignore_index=True)[columns]
+            table['home'] = table['home'].astype(bool)
+            table[['GF','GA']] = table[['GF','GA']].astype(int)
+            if table_file:
+                os.makedirs(self.derived_path,exist_ok=True)
+                self.storage.write(table.set_index(['date','team']),table_file)
+        self.game_parse_errors = pd.concat(errors) if errors else None
+        if self.game_parse_errors is not None and len(self.game_parse_errors):
+            print(f"Game Info Parse Failure: {list(self.game_parse_errors['Game'])}")
+
+        return table.set_index(['date','team'])[['Game','home','GF','opp','GA']]
+
+    #Parses a column of game strings like '2019-10-02 - Canucks 2, Oilers 3', which list the away team first
+    #home sets whether the strings are from the home file so the row is for the home team, otherwise for the away team
+    #Returns a df of parsed games and a df of the strings that didn't parse or have a team not in the team map
+    def parse_games(self,games,home,team_map):
+        parts = games.str.extract(r'^\d{2}(\d{2})-(\d{2})-(\d{2}) - (.+?) (\d+), (.+?) (\d+)$')
+        df = pd.DataFrame({'Game':games,'home':home})
+        df['date'] = parts[0]+'_'+parts[1]+'_'+parts[2]
+        team,gf,opp,ga = (parts[5],parts[6],parts[3],parts[4]) if home else (parts[3],parts[4],parts[5],parts[6])
+        df['team'] = team.map(team_map)
+        df['GF'] = pd.to_numeric(gf)
+        df['opp'] = opp.map(team_map)
+        df['GA'] = pd.to_numeric(ga)
+        failed = df[['date','team','GF','opp','GA']].isna().any(axis=1)
+
+        return df[~failed],df[failed][['Game','home']]
 
 
     '''
@@ -106,17 +206,79 @@ class GameStats:
     #Generates stats df and writes it to specified location
     def write_daily_stats_file(self,path_name,date):
         df = self.get_day_stats(date)
-        df.to_csv(f"{path_name}/{date.strftime('%y_%m_%d')}.csv")
+        self.storage.write(df,f"{path_name}/{date.strftime('%y_%m_%d')}.csv")
+
+        return len(df)
 
     #writes daily stats dfs into specified path name
-    def write_daily_stats_range(self,path_name,start_date,end_date):
-        #loops through each date in range and writes file in the form yy_mm_dd in path name
-        while start_date <= end_date:
-            try:
-                self.write_daily_stats_file(path_name,start_date)
-            except:
-                pass
-            start_date += dt.timedelta(days=1)
+    #Dates are read batch_days at a time on threads with load_day_files and each batch is merged and scored together
+    #workers greater than 1 instead writes each date on that many processes, each date's file is the same either way
+    #Dates missing some of their NST files or whose files can't be read or combined are printed and returned in a dict of date to the missing files or error
+    #A batch that fails to combine is retried one date at a time so only the dates that fail are lost, like writing each date alone
+    #Dates with none of their files are taken as days without games and only counted
+    #run_log (an instrumentation.RunLog) records the rows and any error of each date and the time and memory of each batch (or date with workers)
+    def write_daily_stats_range(self,path_name,start_date,end_date,workers=1,run_log=None,threads=8,batch_days=30):
+        dates = [start_date+dt.timedelta(days=i) for i in range((end_date-start_date).days+1)]
+        problems = {}
+        if workers > 1:
+            records = map_shared_measured(self,'write_daily_stats_file',[(path_name,date) for date in dates],workers,run_log.track_memory if run_log else False)
+            if run_log:
+                run_log.add_measured('daily_stats',dates,records)
+            for date,record in zip(dates,records):
+                if record['status'] == 'error':
+                    missing = [f for f in self.day_files(date).values() if not os.path.exists(f)]
+                    problems[date] = missing if missing else record['error']
+        else:
+            for i in range(0,len(dates),batch_days):
+                batch = dates[i:i+batch_days]
+                with run_log.stage('daily_stats_batch',batch[0]) if run_log else nullcontext({}) as stage:
+                    days,missing,errors = self.load_day_files(batch,threads)
+                    problems.update(missing)
+                    problems.update(errors)
+                    rows = {}
+                    if days:
+                        names = {date.strftime('%y_%m_%d'):date for date in days}
+                        try:
+                            combined = dict(list(self.combine_day_files(days).groupby(level='date',sort=False)))
+                        except Exception:
+                            #one bad date fails the whole batch, so its dates are combined one at a time to only lose the dates that fail
+                            combined = {}
+                            for date in days:
+                                try:
+                                    combined[date.strftime('%y_%m_%d')] = self.combine_day_files({date:days[date]})
+                                except Exception as e:
+                                    problems[date] = e
+                        #writes each date's rows in the form yy_mm_dd in path name
+                        for d,df in combined.items():
+                            try:
+                                self.storage.write(df,f"{path_name}/{d}.csv")
+                                rows[names[d]] = len(df)
+                            except Exception as e:
+                                problems[names[d]] = e
+                    stage['rows'] = sum(rows.values())
+                if run_log:
+                    for date in batch:
+                        if date in rows:
+                            run_log.add({'stage':'daily_stats','date':date,'status':'ok','rows':rows[date]})
+                        else:
+                            run_log.add({'stage':'daily_stats','date':date,'status':'missing' if date in missing else 'error','error':str(problems[date])})
+
+        self.report_problems(problems)
+
+        return problems
+
+    #Prints dates that had some but not all of their NST files or files that couldn't be read, and the number of dates without any files
+    def report_problems(self,problems):
+        no_games = 0
+        for date,problem in sorted(problems.items()):
+            if isinstance(problem,list) and len(problem) == len(self.day_files(date)):
+                no_games += 1
+            elif isinstance(problem,list):
+                print(f"Missing NST files for {date.strftime('%y_%m_%d')}: {problem}")
+            else:
+                print(f"NST files for {date.strftime('%y_%m_%d')} couldn't be read or combined: {problem}")
+        if no_games:
+            print(f"No NST files for {no_games} dates")
 
     '''
     BE CAREFUL WITH THIS FUNCTION
@@ -133,31 +295,43 @@ class GameStats:
                 pass
             start_date += dt.timedelta(days=1)
 
-        pd.concat(df_list).to_csv(file_name)
+        self.storage.write(pd.concat(df_list),file_name)
 
     '''
     BE CAREFUL WITH THIS FUNCTION
     WILL OVERWRITE EXISTING FILES
     '''
     #Similar functionto write_combined_stats that reads in already processed daily stat csvs to avoid re-processing
+    #Rebuilds the whole file in date order, use update_concated_daily_stats to only write new or changed dates
     def write_concated_daily_stats(self,file_name,path_name,max_date=dt.date.today()):
-        file_list = os.listdir(path_name)
-        df_list = []
-        for file in file_list:
-            if file < max_date.strftime('%y_%m_%d'):
-                df_list.append(pd.read_csv(f"{path_name}/{file}").set_index(['date','team','name','position']))
-        pd.concat(df_list).to_csv(file_name)
-            
+        ConcatStore(file_name,path_name,['date','team','name','position'],storage=self.storage).rebuild(max_date)
+
+    #Incremental version of write_concated_daily_stats that appends only dates that are new or changed since the last write
+    #Returns the list of daily files that were written
+    def update_concated_daily_stats(self,file_name,path_name,max_date=dt.date.today()):
+        return ConcatStore(file_name,path_name,['date','team','name','position'],storage=self.storage).update(max_date)
+
+    '''
+    BE CAREFUL WITH THIS FUNCTION
+    WILL OVERWRITE EXISTING FILES
+    '''
+    #Re-scores already processed daily stats files with a different scoring table without re-parsing the raw stats
+    #Writes the re-scored files to out_path, which can be the same as path_name to overwrite in place
+    def rescore_daily_stats(self,path_name,out_path,scoring_table,max_date=dt.date.today()):
+        scoring = Scoring(scoring_table)
+        for file in self.storage.list_files(path_name,max_date):
+            df = self.storage.read(f"{path_name}/{file}",float_precision='round_trip').set_index(['date','team','name','position'])
+            self.storage.write(scoring.rescore(df),f"{out_path}/{file}")
 
-    #helper functions to calculate FP
+    #helper functions to calculate FP for a single player, use the same scoring table as get_day_stats
     def ev_fp(self,g,a,s,b):
-        return 12*g+8*a+1.6*s+1.6*b
+        return self.scoring.fp('ev',{'G':g,'A':a,'SH':s,'BkS':b})
 
     def pp_fp(self,g,a,s,b):
-        return 12.5*g+8.5*a+1.6*s+1.6*b
+        return self.scoring.fp('pp',{'G':g,'A':a,'SH':s,'BkS':b})
 
     def pk_fp(self,g,a,s,b):
-        return 14*g+10*a+1.6*s+1.6*b
+        return self.scoring.fp('pk',{'G':g,'A':a,'SH':s,'BkS':b})
 
     def goalie_fp(self,sv,ga,w,so):
-        return .8*sv-4*ga+12*w+8*so
\ No newline at end of file
+        return self.scoring.fp('goalie',{'SV':sv,'GA':ga,'win':w,'SO':so})
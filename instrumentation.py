@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+import pandas as pd
+import datetime as dt
+import traceback
+import tracemalloc
+import cProfile
+import time
+import json
+import os
+
+#Helpers that record how long each stage of a run takes, how much memory it peaks at, and how many rows it handles
+#Records are kept as dicts and appended to a json lines log file so runs can be compared later to catch slowdowns
+
+#Runs func(*args,**kwargs) and returns a record of its wall time, peak memory, and rows in its result (if it returns a number of rows or a df)
+#Errors are recorded instead of raised so it can be used in process pool workers without losing the record
+def measure(func,args=(),kwargs=None,track_memory=True):
+    record = {'status':'ok','rows':None}
+    tracing = tracemalloc.is_tracing()
+    if track_memory:
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = func(*args,**(kwargs or {}))
+        if isinstance(result,int):
+            record['rows'] = result
+        elif hasattr(result,'__len__'):
+            record['rows'] = len(result)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['seconds'] = time.perf_counter()-start
+    record['peak_bytes'] = tracemalloc.get_traced_memory()[1] if track_memory else None
+    if track_memory and not tracing:
+        tracemalloc.stop()
+
+    return record
+
+#Class that keeps the records of one run and appends them to log_file as json lines if it is given
+#Stages named in profile_stages are run under cProfile and their stats dumped to profile_path
+#track_memory False skips tracemalloc, which slows down code that allocates a lot of small objects
+class RunLog:
+    def __init__(self,log_file=None,profile_path=None,profile_stages=(),track_memory=True,run_id=None):
+        self.log_file = log_file
+        self.profile_path = profile_path
+        self.profile_stages = set(profile_stages)
+        self.track_memory = track_memory
+        self.run_id = run_id or dt.datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
+        self.records = []
+        self.open = []
+
+    #Adds a finished record to the run and the log file
+    def add(self,record):
+        record = {'run_id':self.run_id,**record}
+        if isinstance(record.get('date'),dt.date):
+            record['date'] = record['date'].strftime('%y_%m_%d')
+        self.records.append(record)
+        if self.log_file:
+            with open(self.log_file,'a') as f:
+                f.write(json.dumps(record,default=str)+'\n')
+
+        return record
+
+    #Runs func with measure and adds its record as a stage, errors are recorded but not raised
+    def measure(self,name,date,func,*args,**kwargs):
+        if self.track_memory:
+            self.update_peaks()
+        return self.add({'stage':name,'date':date,**measure(func,args,kwargs,self.track_memory)})
+
+    #Adds the records returned by measure for a list of dates, like the results of a parallel range
+    def add_measured(self,name,dates,records):
+        for date,record in zip(dates,records):
+            self.add({'stage':name,'date':date,**record})
+
+    #Folds the peak memory so far into every open stage before the peak is reset for a new stage
+    def update_peaks(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self.open:
+            record['peak_bytes'] = max(record['peak_bytes'],peak)
+
+    #Context manager that records a stage's wall time, peak memory, and status
+    #Yields the record so the stage can set 'rows' or any other values
+    #Errors are recorded and raised again unless catch is True, in which case they're printed and the run continues
+    @contextmanager
+    def stage(self,name,date=None,catch=False):
+        record = {'stage':name,'date':date,'status':'ok','rows':None,'peak_bytes':0}
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            self.update_peaks()
+            tracemalloc.reset_peak()
+        self.open.append(record)
+        profile = cProfile.Profile() if name in self.profile_stages else None
+        start = time.perf_counter()
+        try:
+            if profile:
+                profile.enable()
+            yield record
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = f'{type(e).__name__}: {e}'
+            record['traceback'] = traceback.format_exc()
+            if not catch:
+                raise
+            print(f'{name} failure: {record["error"]}')
+        finally:
+            if profile:
+                profile.disable()
+                record['profile'] = self.dump_profile(profile,name,date)
+            record['seconds'] = time.perf_counter()-start
+            self.open.pop()
+            if self.track_memory:
+                self.update_peaks()
+                record['peak_bytes'] = max(record['peak_bytes'],tracemalloc.get_traced_memory()[1])
+                if started_tracing:
+                    tracemalloc.stop()
+            else:
+                record['peak_bytes'] = None
+            self.add(record)
+
+    #Writes a stage's cProfile stats to profile_path (or the current folder) and returns the file name
+    def dump_profile(self,profile,name,date=None):
+        path = self.profile_path or '.'
+        os.makedirs(path,exist_ok=True)
+        suffix = f"_{date.strftime('%y_%m_%d')}" if isinstance(date,dt.date) else ''
+        file_name = f"{path}/{self.run_id.replace(':','-')}_{name}{suffix}.prof"
+        profile.dump_stats(file_name)
+
+        return file_name
+
+    #Returns this run's records as a df
+    def to_frame(self):
+        return pd.DataFrame(self.records)
+
+    #Reads every record in a log file into a df
+    @staticmethod
+    def load(log_file):
+        with open(log_file) as f:
+            return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+    #Compares the total time, peak memory, rows, and errors of each stage between two runs in a log file
+    #Runs default to the last two in the file, ratio is new/base so values above 1 are slower or use more memory
+    @staticmethod
+    def compare(log_file,base_run=None,new_run=None):
+        df = RunLog.load(log_file)
+        runs = list(dict.fromkeys(df['run_id']))
+        base_run = base_run or runs[-2]
+        new_run = new_run or runs[-1]
+        totals = {}
+        for name,run in [('base',base_run),('new',new_run)]:
+            run_df = df[df['run_id']==run]
+            totals[name] = run_df.groupby('stage',sort=False).agg(
+                seconds=('seconds','sum'),
+                peak_bytes=('peak_bytes','max'),
+                rows=('rows','sum'),
+                errors=('status',lambda x: (x=='error').sum()),
+            )
+        comp = pd.concat(totals,axis=1)
+        comp[('ratio','seconds')] = comp[('new','seconds')]/comp[('base','seconds')]
+        comp[('ratio','peak_bytes')] = comp[('new','peak_bytes')]/comp[('base','peak_bytes')]
+
+        return comp
@@ -14,9 +14,20 @@ dp_args = {
     'feat_path':'daily_features_last30',
     'feat_file':'train_features.csv',
     'proj_path':'projections_last30',
+    'model_cache_path':'model_cache',
+    'player_stats_file':'player_stats.csv',
+    'run_log_file':'run_log.jsonl',
+    'player_state_file':'player_state.npz',
+    'derived_path':'derived_data',
     'date':dt.date(2021,3,26)
 }
 
 DP = DailyProjection(**dp_args)
 #DP.write_stats_and_features()
-DP.export_todays_projections()
\ No newline at end of file
+DP.export_todays_projections()
+#DP.reproject_pool()
+
+#Keeps today's stats, features, and models loaded and serves projections at http://127.0.0.1:8050 until stopped
+#POST /reproject after the player pool file changes instead of calling DP.reproject_pool()
+#from service import ProjectionService
+#ProjectionService(DP).run()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import time
+import os
+
+#Class that keeps fitted model coefficients so the same model isn't refit from the same training data
+#Entries are keyed by a hash of the training file contents, position, feature list, model type, and model parameters
+#With a cache path, entries are saved as json files and persist between runs, otherwise they're only kept in memory
+#Least recently used entries are evicted once there are more than max_entries
+class ModelCache:
+    def __init__(self,cache_path=None,max_entries=100):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.entries = {}
+        self.index = {}
+        if cache_path:
+            os.makedirs(cache_path,exist_ok=True)
+            if os.path.exists(self.index_file()):
+                with open(self.index_file()) as f:
+                    self.index = json.load(f)
+
+    def index_file(self):
+        return f"{self.cache_path}/index.json"
+
+    def entry_file(self,key):
+        return f"{self.cache_path}/{key}.json"
+
+    def write_index(self):
+        if self.cache_path:
+            with open(self.index_file(),'w') as f:
+                json.dump(self.index,f,indent=1)
+
+    #Hashes a file's contents to identify the training data a model was fit on
+    def file_hash(self,file_name):
+        with open(file_name,'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    #Creates the key for a model from the training data hash and everything else that changes the fit
+    def key(self,data_hash,pos,feature_list,model_type,**params):
+        s = json.dumps([data_hash,pos,list(feature_list),model_type,params],sort_keys=True)
+        return hashlib.sha256(s.encode()).hexdigest()
+
+    #Returns the cached entry (coef, intercept, features) for a key or None if it isn't cached
+    def get(self,key):
+        if key not in self.index:
+            return None
+        if key not in self.entries:
+            try:
+                with open(self.entry_file(key)) as f:
+                    self.entries[key] = json.load(f)
+            except (OSError,ValueError):
+                self.invalidate(key)
+                return None
+        self.index[key]['last_used'] = time.time()
+        self.write_index()
+
+        return self.entries[key]
+
+    #Saves a fitted model's coefficients under a key, data_hash is kept so all models for a training file can be invalidated
+    def put(self,key,model,data_hash):
+        entry = {'coef':[float(c) for c in model.coef_],'intercept':float(model.intercept_),'features':[str(f) for f in model.feature_names_in_]}
+        self.entries[key] = entry
+        self.index[key] = {'data_hash':data_hash,'last_used':time.time()}
+        if self.cache_path:
+            with open(self.entry_file(key),'w') as f:
+                json.dump(entry,f)
+        self.evict()
+        self.write_index()
+
+    #Removes the least recently used entries until there are at most max_entries
+    def evict(self):
+        for key in sorted(self.index,key=lambda k: self.index[k]['last_used'])[:max(len(self.index)-self.max_entries,0)]:
+            self.remove(key)
+
+    def remove(self,key):
+        self.index.pop(key,None)
+        self.entries.pop(key,None)
+        if self.cache_path and os.path.exists(self.entry_file(key)):
+            os.remove(self.entry_file(key))
+
+    #Removes one entry by key, every entry fit on the training data with the given hash, or the whole cache if neither is given
+    def invalidate(self,key=None,data_hash=None):
+        if key is not None:
+            keys = [key]
+        elif data_hash is not None:
+            keys = [k for k in self.index if self.index[k]['data_hash']==data_hash]
+        else:
+            keys = list(self.index)
+        for k in keys:
+            self.remove(k)
+        self.write_index()
@@ -0,0 +1,56 @@
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import measure
+
+#Helpers that run one method of a large object (like a Feature with the full stats df) for many dates on a process pool
+#The object is handed to each worker once when the worker starts instead of being pickled with every task
+#Where fork is available (linux, mac) workers share the parent's memory read only instead of copying it
+
+#Object the worker process calls methods on, set once per worker by the pool initializer
+_shared = None
+
+def _set_shared(obj):
+    global _shared
+    _shared = obj
+
+def _call_shared(method,args,kwargs):
+    return getattr(_shared,method)(*args,**kwargs)
+
+def _measure_shared(method,args,kwargs,track_memory):
+    return measure(getattr(_shared,method),args,kwargs,track_memory)
+
+#Gets the multiprocessing context to use, fork when the platform has it so the shared object isn't pickled at all
+def get_context():
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    return mp.get_context()
+
+#Calls obj.method(*args,**kwargs) for each args tuple in arg_list across a pool of worker processes
+#Returns a list with the result of each call in the same order as arg_list, or the exception it raised
+def map_shared(obj,method,arg_list,workers,**kwargs):
+    with ProcessPoolExecutor(workers,mp_context=get_context(),initializer=_set_shared,initargs=(obj,)) as pool:
+        futures = [pool.submit(_call_shared,method,args,kwargs) for args in arg_list]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+
+    return results
+
+#Same as map_shared but returns a record from instrumentation.measure for each call (wall time, peak memory, rows, and any error) instead of its result
+def map_shared_measured(obj,method,arg_list,workers,track_memory=True,**kwargs):
+    with ProcessPoolExecutor(workers,mp_context=get_context(),initializer=_set_shared,initargs=(obj,)) as pool:
+        futures = [pool.submit(_measure_shared,method,args,kwargs,track_memory) for args in arg_list]
+
+        return [future.result() for future in futures]
+
+#Starts a pool of worker processes that each hold obj, for long running programs that submit calls as they come in
+#Workers keep the obj from when the pool started, so they need a new pool to see later changes to it
+def shared_pool(obj,workers):
+    return ProcessPoolExecutor(workers,mp_context=get_context(),initializer=_set_shared,initargs=(obj,))
+
+#Submits obj.method(*args,**kwargs) to a pool from shared_pool and returns its future
+def submit_shared(pool,method,*args,**kwargs):
+    return pool.submit(_call_shared,method,args,kwargs)
@@ -0,0 +1,254 @@
+from storage import Storage
+import pandas as pd
+import numpy as np
+import datetime as dt
+import json
+import os
+
+#Class that computes every player's mean stats over their last n games for every date in one pass
+#Takes a stats df indexed by date and name (like the position dfs in Feature.stats) sorted by date
+#snapshot returns the same means and games played that Feature.regressed_mean gets from the full history up to a date
+class RollingState:
+    def __init__(self,stats,stats_list,sample_size):
+        self.stats_list = stats_list
+        self.sample_size = sample_size
+
+        #calculates rolling means and GP for each player's games with a single groupby-rolling pass
+        df = stats[stats_list].dropna().reset_index()
+        grouped = df.groupby('name',sort=False)
+        means = grouped[stats_list].rolling(sample_size,min_periods=1).mean().reset_index(level=0,drop=True)
+        means['GP'] = (grouped.cumcount()+1).clip(upper=sample_size)
+        means[['date','name']] = df[['date','name']]
+        self.rolling = means.sort_values('date',kind='stable').set_index('name')
+        self.dates = self.rolling['date'].to_numpy()
+
+        self.snap = None
+        self.snap_date = None
+
+    #Returns a df indexed by name of each player's latest rolling means and GP as of the given date
+    #Dates asked for in increasing order only apply the rows between the two dates to the last snapshot
+    def snapshot(self,date):
+        d = date.strftime('%y_%m_%d')
+        if self.snap is None or d < self.snap_date:
+            rows = self.rolling.iloc[:np.searchsorted(self.dates,d,side='right')]
+            snap = rows[~rows.index.duplicated(keep='last')]
+        else:
+            start = np.searchsorted(self.dates,self.snap_date,side='right')
+            rows = self.rolling.iloc[start:np.searchsorted(self.dates,d,side='right')]
+            rows = rows[~rows.index.duplicated(keep='last')]
+            snap = pd.concat([self.snap.drop(rows.index,errors='ignore'),rows])
+        self.snap = snap.sort_index()
+        self.snap_date = d
+
+        return self.snap[self.stats_list+['GP']]
+
+#Class that keeps every player's exponentially decayed sums of their stats and games played
+#Each game is weighted decay = 0.5**(1/half_life) times the game after it, so a game half_life games back counts half as much
+#snapshot returns the decayed means and effective games played (the sum of the weights) as of a date
+#Moving forward to a date only adds the games between the two dates, so each date costs O(players) however long the history is
+class DecayState:
+    def __init__(self,stats,stats_list,half_life):
+        self.stats_list = stats_list
+        self.decay = .5**(1/half_life)
+
+        df = stats[stats_list].dropna()
+        df = df.iloc[np.argsort(df.index.get_level_values('date').to_numpy(),kind='stable')]
+        self.dates = df.index.get_level_values('date').to_numpy()
+        self.codes,self.names = pd.factorize(df.index.get_level_values('name'))
+        #last column is a 1 for each game so its decayed sum is the effective games played
+        self.values = np.column_stack([df.to_numpy(dtype='float64'),np.ones(len(df))])
+
+        self.sums = None
+        self.pos = 0
+        self.snap_date = None
+
+    #Decays each player's sums by the games they played in rows start to end and adds those games
+    def update(self,start,end):
+        codes = self.codes[start:end]
+        games = np.bincount(codes,minlength=len(self.names))
+        #number of the player's games in the rows that come after each game
+        later = pd.Series(codes).groupby(codes).cumcount(ascending=False).to_numpy()
+        added = np.zeros_like(self.sums)
+        np.add.at(added,codes,self.values[start:end]*self.decay**later[:,None])
+        self.sums = self.sums*self.decay**games[:,None]+added
+
+    #Returns a df indexed by name of each player's decayed means and effective GP as of the given date
+    #Dates asked for in increasing order only add the games between the two dates to the last sums
+    def snapshot(self,date):
+        d = date.strftime('%y_%m_%d')
+        if self.sums is None or d < self.snap_date:
+            self.sums = np.zeros((len(self.names),self.values.shape[1]))
+            self.pos = 0
+        end = np.searchsorted(self.dates,d,side='right')
+        self.update(self.pos,end)
+        self.pos = end
+        self.snap_date = d
+
+        played = self.sums[:,-1] > 0
+        snap = pd.DataFrame(self.sums[played,:-1]/self.sums[played,-1:],index=pd.Index(self.names[played],name='name'),columns=self.stats_list)
+        snap['GP'] = self.sums[played,-1]
+
+        return snap.sort_index()
+
+#Class that keeps one position group's last sample_size games for every player in a ring buffer
+#values holds each player's games in sample_size slots that are overwritten oldest first, head is the slot the next game goes in
+#Means are summed straight from the buffer when a snapshot is taken so they don't drift the way running sums updated for years would
+class GameBuffer:
+    def __init__(self,stats_list,sample_size,names=(),values=None,count=None,head=None,last_date=None):
+        self.stats_list = stats_list
+        self.sample_size = sample_size
+        self.names = list(names)
+        self.index = {name:i for i,name in enumerate(self.names)}
+        n = len(self.names)
+        self.values = values if values is not None else np.zeros((n,sample_size,len(stats_list)))
+        self.count = count if count is not None else np.zeros(n,dtype=int)
+        self.head = head if head is not None else np.zeros(n,dtype=int)
+        self.last_date = last_date
+
+    #Gets the row of each name, adding rows for players that haven't played yet
+    def get_rows(self,names):
+        new = [name for name in dict.fromkeys(names) if name not in self.index]
+        if new:
+            for name in new:
+                self.index[name] = len(self.names)
+                self.names.append(name)
+            self.values = np.concatenate([self.values,np.zeros((len(new),self.sample_size,len(self.stats_list)))])
+            self.count = np.concatenate([self.count,np.zeros(len(new),dtype=int)])
+            self.head = np.concatenate([self.head,np.zeros(len(new),dtype=int)])
+
+        return np.array([self.index[name] for name in names],dtype=int)
+
+    #Adds one date's games, a player with more than one row that date has them added in order
+    def add(self,date,names,values):
+        rows = self.get_rows(names)
+        occurrence = pd.Series(rows).groupby(rows).cumcount().to_numpy()
+        for k in range(occurrence.max()+1 if len(rows) else 0):
+            r = rows[occurrence==k]
+            self.values[r,self.head[r]] = values[occurrence==k]
+            self.head[r] = (self.head[r]+1)%self.sample_size
+            self.count[r] = np.minimum(self.count[r]+1,self.sample_size)
+        self.last_date = date
+
+    #Fills the buffer from a stats df indexed by date and name, keeping each player's last sample_size games
+    def fill(self,stats):
+        df = stats[self.stats_list].dropna()
+        df = df.iloc[np.argsort(df.index.get_level_values('date').to_numpy(),kind='stable')]
+        names = df.index.get_level_values('name')
+        last = df.groupby(names).tail(self.sample_size)
+        last_names = last.index.get_level_values('name')
+        rows = self.get_rows(list(last_names))
+        slots = pd.Series(rows).groupby(rows).cumcount().to_numpy()
+        self.values[rows,slots] = last.to_numpy(dtype='float64')
+        self.count = np.bincount(rows,minlength=len(self.names)).clip(max=self.sample_size)
+        self.head = self.count%self.sample_size
+        self.last_date = df.index.get_level_values('date').max() if len(df) else None
+
+    #Returns a df indexed by name of each player's means over their last sample_size games and GP, like RollingState.snapshot
+    #date can't be before the last date added since those games can't be taken back out
+    def snapshot(self,date=None):
+        if date is not None and self.last_date is not None and date.strftime('%y_%m_%d') < self.last_date:
+            raise ValueError(f"Player state has games through {self.last_date} and can't be used for {date.strftime('%y_%m_%d')}")
+        played = self.count > 0
+        means = self.values[played].sum(axis=1)/self.count[played,None]
+        snap = pd.DataFrame(means,index=pd.Index(np.array(self.names,dtype=object)[played],name='name'),columns=self.stats_list)
+        snap['GP'] = self.count[played]
+
+        return snap.sort_index()
+
+#Class that keeps a GameBuffer of every player's last sample_size games for each position group (F, D, G) and saves them to cache_file
+#Each day only yesterday's daily stats file is added, so today's means are read from the buffers instead of regrouping the whole history
+#load returns False if there's no cache or it was saved with different stats or sample size, then it should be rebuilt from the full stats
+#hashes keeps the hash of every daily stats file in the buffers (from the stats file's ConcatStore manifest) so a file rewritten
+#after it was added, like yesterday's stats after NST corrects them, is caught by changed_files and the buffers rebuilt
+class PlayerStateCache:
+    def __init__(self,cache_file,stats_list,sample_size,storage=None):
+        self.cache_file = cache_file
+        self.stats_list = stats_list
+        self.sample_size = sample_size
+        self.storage = storage if storage else Storage()
+        self.buffers = {key:GameBuffer(stats_list,sample_size) for key in ['F','D','G']}
+        self.hashes = {}
+        self.positions = {'L':'F','C':'F','R':'F','D':'D','G':'G'}
+
+    #Date of the last stats added, the same for every position group
+    def last_date(self):
+        dates = [b.last_date for b in self.buffers.values() if b.last_date is not None]
+        return max(dates) if dates else None
+
+    #Builds the buffers from the full history of position dfs like Feature.stats
+    #hashes is a dict of daily stats file to hash for the files the history was read from
+    def rebuild(self,stats,hashes=None):
+        self.buffers = {key:GameBuffer(self.stats_list,self.sample_size) for key in ['F','D','G']}
+        for key in self.buffers:
+            self.buffers[key].fill(stats[key])
+        last = self.last_date()
+        for b in self.buffers.values():
+            b.last_date = last
+        self.hashes = dict(hashes) if hashes else {}
+
+    #Adds one daily stats df (like a file in daily_game_stats) to the buffers
+    def add_day(self,df):
+        date = df['date'].iloc[0] if len(df) else None
+        df = df.dropna(subset=self.stats_list)
+        for key,group in df.groupby(df['position'].map(self.positions)):
+            self.buffers[key].add(date,list(group['name']),group[self.stats_list].to_numpy(dtype='float64'))
+        for b in self.buffers.values():
+            b.last_date = date
+
+    #Adds every daily stats file in stats_path after the last date added through max_date and returns the dates added
+    #hashes is a dict of daily stats file to its current hash, the added files' hashes are kept to compare with changed_files
+    def update(self,stats_path,max_date,hashes=None):
+        last = self.last_date() or ''
+        files = [f for f in self.storage.list_files(stats_path,max_date+dt.timedelta(days=1)) if f[:8] > last]
+        for file in files:
+            self.add_day(self.storage.read(f"{stats_path}/{file}",['date','name','position']+self.stats_list))
+            self.hashes[file] = hashes.get(file) if hashes else None
+
+        return [f[:8] for f in files]
+
+    #Returns the daily stats files in the buffers whose hash has changed or that are gone, given a dict of each file's current hash
+    def changed_files(self,hashes):
+        return [file for file in self.hashes if hashes.get(file) != self.hashes[file]]
+
+    #Saves the buffers to cache_file as a numpy archive with the stats list, sample size, and file hashes they were built with
+    def save(self):
+        arrays = {'meta':np.array(json.dumps({'stats_list':self.stats_list,'sample_size':self.sample_size,'last_date':self.last_date(),'hashes':self.hashes}))}
+        for key,b in self.buffers.items():
+            arrays[f'{key}_names'] = np.array(b.names,dtype=str)
+            arrays[f'{key}_values'] = b.values
+            arrays[f'{key}_count'] = b.count
+            arrays[f'{key}_head'] = b.head
+        with open(self.cache_file,'wb') as f:
+            np.savez(f,**arrays)
+
+    #Loads the buffers from cache_file, returns False without changing anything if it can't be used
+    #Caches saved without file hashes can't be checked for changed files so they can't be used either
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return False
+        with np.load(self.cache_file) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['stats_list'] != self.stats_list or meta['sample_size'] != self.sample_size or 'hashes' not in meta:
+                return False
+            self.buffers = {
+                key:GameBuffer(self.stats_list,self.sample_size,data[f'{key}_names'].tolist(),data[f'{key}_values'],data[f'{key}_count'],data[f'{key}_head'],meta['last_date'])
+                for key in ['F','D','G']
+            }
+            self.hashes = meta['hashes']
+
+        return True
+
+    #Compares the buffers' snapshots to means recomputed from the full history of position dfs like Feature.stats
+    #Returns a df of the players missing from either side and the largest difference for each position group
+    def check(self,stats,date,tol=1e-9):
+        rows = {}
+        for key,b in self.buffers.items():
+            cached = b.snapshot()
+            full = RollingState(stats[key],self.stats_list,self.sample_size).snapshot(date)
+            both = cached.index.intersection(full.index)
+            diff = (cached.loc[both]-full.loc[both]).abs().max().max() if len(both) else 0.0
+            rows[key] = {'players':len(full),'missing':len(full.index.difference(cached.index)),'extra':len(cached.index.difference(full.index)),'max_diff':diff}
+        result = pd.DataFrame(rows).T.astype({'players':int,'missing':int,'extra':int,'max_diff':float})
+        result['ok'] = (result['missing']==0) & (result['extra']==0) & (result['max_diff']<=tol)
+
+        return result
@@ -1,12 +1,20 @@
 import pandas as pd
+import numpy as np
 from regression import Regression
+from storage import Storage
+from feature import Feature
 
 #Class uses regression class to project fantasy points
 class Projection:
     #Creates Regression object with test file and separates test features by position
-    def __init__(self,train_file,test_file):
-        self.regression = Regression(train_file)
-        df = pd.read_csv(test_file)
+    #cache is an optional ModelCache used by the regression to skip refitting models
+    def __init__(self,train_file,test_file,storage=None,cache=None):
+        self.storage = storage if storage else Storage()
+        self.regression = Regression(train_file,self.storage,cache)
+        self.set_test_features(self.storage.read(test_file))
+
+    #Separates a df of test features by position, can be called again to project a new set of features with the same models
+    def set_test_features(self,df):
         self.test_features = {}
         self.test_features['A'] = df.copy()
         self.test_features['G'] = df[df['position']=='G'].copy()
@@ -45,4 +53,94 @@ class Projection:
         df['proj_FP'] = df['proj_FP/60']*df['mean_TOI']/60
         df['proj_value'] = df['proj_FP']/df['salary']*1000
         df = df.sort_values('proj_FP',ascending=False)
-        df.to_csv(file_name)
\ No newline at end of file
+        df.to_csv(file_name)
+
+    #Fits a model for each position and returns a ProjectionEngine that projects any features with them
+    #model is 'ols' or 'ridge', alpha is only used by ridge
+    def engine(self,f_feature_list,d_feature_list,g_feature_list,model='ridge',alpha=1.0):
+        feature_lists = {'F':f_feature_list,'D':d_feature_list,'G':g_feature_list}
+        fit = lambda pos: self.regression.ridge(pos,feature_lists[pos],alpha=alpha) if model == 'ridge' else self.regression.ols(pos,feature_lists[pos])
+        models = {pos:(feature_lists[pos],fit(pos)) for pos in feature_lists}
+
+        return ProjectionEngine({pos:(fl,m.coef_,m.intercept_) for pos,(fl,m) in models.items()})
+
+#Class that projects FP from features with each position's model coefficients as numpy arrays
+#Each position's features are one matrix so projections for every player, slate, and scenario are a single matrix product
+#models is a dict of position (F, D, G) to (feature list, coefficients, intercept)
+#Vegas based features (implied_win_prob, implied_opp_score) are recalculated from implied_team_score and over_under in each scenario
+class ProjectionEngine:
+    def __init__(self,models):
+        self.models = {pos:(list(fl),np.asarray(coef,dtype='float64'),float(intercept)) for pos,(fl,coef,intercept) in models.items()}
+        self.positions = {'C':'F','W':'F','D':'D','G':'G'}
+
+    #Calculates the columns that depend on vegas lines from a dict of implied_team_score and over_under arrays
+    def vegas_features(self,cols):
+        return {
+            'implied_win_prob':Feature.implied_win_prob(cols['implied_team_score'],cols['over_under']),
+            'implied_opp_score':cols['over_under']-cols['implied_team_score'],
+        }
+
+    #Applies a scenario's overrides to a df's columns and returns a dict of the changed column arrays
+    #Each override is a column name to a value for every row, a Series indexed by team for only those teams, or an array with a value per row
+    def scenario_columns(self,df,overrides):
+        cols = {}
+        for col,value in overrides.items():
+            base = df[col].to_numpy(dtype='float64')
+            if isinstance(value,pd.Series):
+                cols[col] = df['team'].map(value).to_numpy(dtype='float64')
+                cols[col] = np.where(np.isnan(cols[col]),base,cols[col])
+            else:
+                cols[col] = np.broadcast_to(np.asarray(value,dtype='float64'),base.shape).copy()
+        if 'implied_team_score' in cols or 'over_under' in cols:
+            vegas = {c:cols.get(c,df[c].to_numpy(dtype='float64')) for c in ['implied_team_score','over_under']}
+            cols.update(self.vegas_features(vegas))
+
+        return cols
+
+    #Projects FP/60, FP, and value for every row of a features df in one pass per position
+    #features can be one df or a dict of slate names to dfs, which are projected together with a slate column added
+    #scenarios is an optional dict of scenario names to overrides (see scenario_columns), each scenario is projected from
+    #a stack of every scenario's feature matrices and the results are stacked with a scenario column added
+    #Returns the rows indexed by date, name, and position sorted by proj_FP like Projection.export_projections
+    def project(self,features,scenarios=None):
+        if isinstance(features,dict):
+            features = pd.concat(features,names=['slate']).reset_index(level=0).reset_index(drop=True)
+        df = features.reset_index(drop=True)
+        names = list(scenarios) if scenarios else [None]
+        cols = [self.scenario_columns(df,scenarios[name]) for name in names] if scenarios else [{}]
+        group = df['position'].map(self.positions).to_numpy()
+
+        proj = np.full((len(names),len(df)),np.nan)
+        for pos,(feature_list,coef,intercept) in self.models.items():
+            rows = np.flatnonzero(group==pos)
+            if not len(rows):
+                continue
+            #stacks each scenario's matrix, columns the scenario doesn't change are the same for every scenario
+            base = df.loc[rows,feature_list].to_numpy(dtype='float64')
+            x = np.repeat(base[None],len(names),axis=0)
+            for s in range(len(names)):
+                for j,f in enumerate(feature_list):
+                    if f in cols[s]:
+                        x[s,:,j] = cols[s][f][rows]
+            #column major like the matrices sklearn predicts from so projections match Projection.project_ols/ridge exactly
+            x = np.asfortranarray(x.reshape(-1,len(feature_list)))
+            proj[:,rows] = (x@coef+intercept).reshape(len(names),len(rows))
+        mean_toi = df['mean_TOI'].to_numpy(dtype='float64')
+        salary = df['salary'].to_numpy(dtype='float64')
+        proj_fp = proj*mean_toi/60
+        proj_value = proj_fp/salary*1000
+
+        results = []
+        for s,name in enumerate(names):
+            out = df.assign(**cols[s]) if cols[s] else df.copy()
+            out['proj_FP/60'] = proj[s]
+            out['proj_FP'] = proj_fp[s]
+            out['proj_value'] = proj_value[s]
+            if name is not None:
+                out.insert(0,'scenario',name)
+            results.append(out)
+        groups = [c for c in ['scenario','slate'] if c in results[0].columns]
+        out = pd.concat(results,ignore_index=True).set_index(groups+['date','name','position'])
+
+        #each scenario and slate is sorted by proj_FP on its own
+        return out.sort_values(groups+['proj_FP'],ascending=[True]*len(groups)+[False])
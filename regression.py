@@ -1,29 +1,143 @@
 import pandas as pd
+import numpy as np
 import sklearn.linear_model as sk
+import itertools
+from storage import Storage
+from parallel import map_shared
 
 #Class that performs either OLS or ridge regression given a file of features and a list of those features to use
+#If a ModelCache is given, fitted coefficients are reused for the same training file contents, position, features, and model
 class Regression:
-    def __init__(self,feature_file):
+    def __init__(self,feature_file,storage=None,cache=None):
         #reades in feature file and separates by position
-        df = pd.read_csv(feature_file).set_index(['date','name'])
+        self.storage = storage if storage else Storage()
+        df = self.storage.read(feature_file).set_index(['date','name'])
         self.features = {}
         self.features['G'] = df[df['position']=='G'].drop('position',axis=1)
         self.features['S'] = df[df['position']!='G'].drop('position',axis=1)
         self.features['F'] = df[df['position'].isin(['C','W'])].drop('position',axis=1)
         self.features['D'] = df[df['position']=='D'].drop('position',axis=1)
+        self.cache = cache
+        self.data_hash = cache.file_hash(self.storage.path(feature_file)) if cache else None
 
     #fits features to target variable FP/60 using OLS
-    def ols(self,pos,feature_list):
-        ols = sk.LinearRegression()
-        df = self.features[pos].copy()
-        ols.fit(df[feature_list],df['FP/60'])
-    
-        return ols
+    #max_date optionally only trains on dates before it (a yy_mm_dd string)
+    def ols(self,pos,feature_list,max_date=None):
+        return self.fit(sk.LinearRegression(),'ols',pos,feature_list,max_date)
     
     #fits features to target variable FP/60 using ridge
-    def ridge(self,pos,feature_list):
-        ridge = sk.Ridge()
+    def ridge(self,pos,feature_list,max_date=None,alpha=1.0):
+        return self.fit(sk.Ridge(alpha=alpha),'ridge',pos,feature_list,max_date)
+
+    #Helper function that fits the given sklearn model, or restores its coefficients from the cache if it has been fit before
+    def fit(self,model,model_type,pos,feature_list,max_date=None):
+        if self.cache is not None:
+            params = model.get_params()
+            if max_date is not None:
+                params['max_date'] = max_date
+            key = self.cache.key(self.data_hash,pos,feature_list,model_type,**params)
+            entry = self.cache.get(key)
+            if entry is not None:
+                model.coef_ = np.array(entry['coef'])
+                model.intercept_ = entry['intercept']
+                model.feature_names_in_ = np.array(entry['features'],dtype=object)
+                model.n_features_in_ = len(entry['features'])
+                return model
+
         df = self.features[pos].copy()
-        ridge.fit(df[feature_list],df['FP/60'])
-    
-        return ridge
\ No newline at end of file
+        if max_date is not None:
+            df = df[df.index.get_level_values('date')<max_date]
+        model.fit(df[feature_list],df['FP/60'])
+        if self.cache is not None:
+            self.cache.put(key,model,self.data_hash)
+
+        return model
+
+    #Calculates the gram matrix Z'Z of Z = [1, features, FP/60] for each date, the sufficient statistics of a least squares fit
+    #Returns the sorted dates and an array of one gram matrix per date that can be summed over any set of dates
+    def date_grams(self,pos,feature_list):
+        df = self.features[pos].sort_index(level='date',kind='stable')
+        dates,starts = np.unique(df.index.get_level_values('date'),return_index=True)
+        z = np.column_stack([np.ones(len(df)),df[feature_list].to_numpy(dtype='float64'),df['FP/60'].to_numpy(dtype='float64')])
+        grams = np.stack([z[a:b].T@z[a:b] for a,b in zip(starts,list(starts[1:])+[len(df)])])
+
+        return dates,grams
+
+    #Helper function that takes the rows and columns of a gram matrix built on feature_list for the features in sub_list
+    def sub_gram(self,gram,feature_list,sub_list):
+        idx = [0]+[feature_list.index(f)+1 for f in sub_list]+[len(feature_list)+1]
+        return gram[...,idx,:][...,:,idx]
+
+    #Solves for the coefficients and intercept of a fit from a gram matrix
+    #alpha 0 is OLS, alpha greater than 0 is ridge with an unpenalized intercept, the same as sklearn's Ridge
+    def solve_gram(self,gram,alpha=0):
+        n = gram[0,0]
+        x_mean = gram[0,1:-1]/n
+        y_mean = gram[0,-1]/n
+        xx = gram[1:-1,1:-1]-n*np.outer(x_mean,x_mean)
+        xy = gram[1:-1,-1]-n*x_mean*y_mean
+        xx = xx+alpha*np.eye(len(xy))
+        try:
+            coef = np.linalg.solve(xx,xy)
+        except np.linalg.LinAlgError:
+            coef = np.linalg.lstsq(xx,xy,rcond=None)[0]
+
+        return coef,y_mean-x_mean@coef
+
+    #Lists every subset of a pool of features with between min_size and max_size features to use as search candidates
+    def feature_subsets(self,feature_pool,min_size=1,max_size=None):
+        max_size = max_size if max_size else len(feature_pool)
+        return [list(c) for n in range(min_size,max_size+1) for c in itertools.combinations(feature_pool,n)]
+
+    #Scores one candidate feature list for every alpha with cross validation, using the gram matrices set up by search
+    #Each fold trains on the other folds' summed grams and gets its squared error from its own gram, so no rows are touched
+    def cv_score(self,feature_list,alphas):
+        features,fold_grams = self.search_grams
+        grams = self.sub_gram(fold_grams,features,feature_list)
+        total = grams.sum(axis=0)
+        scores = []
+        for alpha in alphas:
+            sse = 0
+            for test in grams:
+                coef,intercept = self.solve_gram(total-test,alpha)
+                v = np.concatenate([[-intercept],-coef,[1]])
+                sse += v@test@v
+            scores.append(np.sqrt(sse/total[0,0]))
+
+        return scores
+
+    #Searches candidate feature lists and ridge alphas (0 is OLS) for a position with date grouped cross validation
+    #Dates are split into n_folds blocks of whole days so no day is in more than one fold
+    #Candidates are scored across a pool of workers processes that share the gram matrices, which are only computed once
+    #Candidates that raise in a worker are left out of the table and reported, if every candidate fails the first error is raised
+    #Returns a table of every candidate and alpha ranked by cross validated RMSE of FP/60, and the winning configuration
+    def search(self,pos,candidates,alphas=(0,.1,1,10,100),n_folds=5,workers=1):
+        features = list(dict.fromkeys(f for c in candidates for f in c))
+        dates,grams = self.date_grams(pos,features)
+        fold_grams = np.stack([grams[idx].sum(axis=0) for idx in np.array_split(np.arange(len(dates)),n_folds)])
+        self.search_grams = (features,fold_grams)
+        try:
+            if workers > 1:
+                scores = map_shared(self,'cv_score',[(c,alphas) for c in candidates],workers)
+            else:
+                scores = [self.cv_score(c,alphas) for c in candidates]
+        finally:
+            self.search_grams = None
+
+        failed = [(c,s) for c,s in zip(candidates,scores) if isinstance(s,Exception)]
+        for c,e in failed:
+            print(f"Search Failure ({pos}): {c} {type(e).__name__}: {e}")
+        if len(failed) == len(candidates):
+            raise failed[0][1]
+        rows = [{'pos':pos,'features':c,'n_features':len(c),'alpha':alpha,'cv_rmse':score} for c,s in zip(candidates,scores) if not isinstance(s,Exception) for alpha,score in zip(alphas,s)]
+        table = pd.DataFrame(rows).sort_values('cv_rmse',kind='stable').reset_index(drop=True)
+        best = table.iloc[0][['features','alpha','cv_rmse']].to_dict()
+
+        return table,best
+
+    #Runs search for each position in a dict of position candidates, returns one ranked table and a dict of each position's winner
+    def search_positions(self,candidates,alphas=(0,.1,1,10,100),n_folds=5,workers=1):
+        results = {pos:self.search(pos,candidates[pos],alphas,n_folds,workers) for pos in candidates}
+        table = pd.concat([results[pos][0] for pos in results],ignore_index=True)
+
+        return table,{pos:results[pos][1] for pos in results}
@@ -0,0 +1,73 @@
+import numpy as np
+
+#Scoring tables map each strength state to the points awarded per stat
+#Skater strength states use the stat suffixes found in the daily stats columns (evG, ppA, pkBkS, etc.)
+#Goalie stats use the goalie columns (SV, GA, win, SO)
+FANDUEL = {
+    'ev':{'G':12,'A':8,'SH':1.6,'BkS':1.6},
+    'pp':{'G':12.5,'A':8.5,'SH':1.6,'BkS':1.6},
+    'pk':{'G':14,'A':10,'SH':1.6,'BkS':1.6},
+    'goalie':{'SV':.8,'GA':-4,'win':12,'SO':8},
+}
+
+#Per event values only, milestone bonuses (hat tricks, 5+ shots, etc.) can't be scored from these stats
+DRAFTKINGS = {
+    'ev':{'G':8.5,'A':5,'SH':1.5,'BkS':1.3},
+    'pp':{'G':8.5,'A':5,'SH':1.5,'BkS':1.3},
+    'pk':{'G':10.5,'A':7,'SH':1.5,'BkS':1.3},
+    'goalie':{'SV':.7,'GA':-3.5,'win':6,'SO':4},
+}
+
+SITE_TABLES = {'fanduel':FANDUEL,'draftkings':DRAFTKINGS}
+
+#Class that calculates fantasy points for whole columns of stats at once using a scoring table
+#Takes either the name of a site in SITE_TABLES or a scoring table dict in the same form as FANDUEL
+class Scoring:
+    def __init__(self,table='fanduel'):
+        self.table = SITE_TABLES[table] if isinstance(table,str) else table
+
+    #Calculates FP given a strength state and a dict of stat values, values can be scalars or arrays
+    #Points are added in table order so results match the original hand written formulas exactly
+    def fp(self,strength,values):
+        points = self.table[strength]
+        fp = None
+        for stat in points:
+            term = points[stat]*values[stat]
+            fp = term if fp is None else fp+term
+        return fp
+
+    #Calculates FP for one strength state from a skater stats df with columns like evG, evA, evSH, evBkS
+    def strength_fp(self,stats,strength):
+        return self.fp(strength,{stat:stats[strength+stat].to_numpy(dtype='float64') for stat in self.table[strength]})
+
+    #Calculates goalie FP from a df with columns SV, GA, win, SO
+    def goalie_fp(self,goalie_stats):
+        return self.fp('goalie',{stat:goalie_stats[stat].to_numpy(dtype='float64') for stat in self.table['goalie']})
+
+    #Adds evFP, ppFP, pkFP, TOI, FP, and FP/60 columns to a skater stats df
+    def score_skaters(self,stats):
+        for strength in ['ev','pp','pk']:
+            stats[f'{strength}FP'] = self.strength_fp(stats,strength)
+        stats['TOI'] = stats['evTOI']+stats['ppTOI']+stats['pkTOI']
+        stats['FP'] = stats['evFP']+stats['ppFP']+stats['pkFP']
+        stats['FP/60'] = stats['FP']/stats['TOI']*60
+        return stats
+
+    #Adds FP and FP/60 columns to a goalie stats df
+    def score_goalies(self,goalie_stats):
+        goalie_stats['FP'] = self.goalie_fp(goalie_stats)
+        goalie_stats['FP/60'] = goalie_stats['FP']/goalie_stats['TOI']*60
+        return goalie_stats
+
+    #Re-scores an already processed daily stats df (like the ones in daily_game_stats) with this scoring table
+    #Skaters and goalies are separated using the position column or index level
+    def rescore(self,df):
+        df = df.copy()
+        position = df['position'] if 'position' in df.columns else df.index.get_level_values('position').to_series(index=df.index)
+        goalie = (position=='G').to_numpy()
+        skater_fp = {strength:self.strength_fp(df,strength) for strength in ['ev','pp','pk']}
+        for strength in skater_fp:
+            df[f'{strength}FP'] = np.where(goalie,0.0,skater_fp[strength])
+        df['FP'] = np.where(goalie,self.goalie_fp(df),df['evFP']+df['ppFP']+df['pkFP'])
+        df['FP/60'] = (df['FP']/df['TOI']*60).fillna(0)
+        return df
@@ -0,0 +1,185 @@
+from projection import Projection
+from parallel import shared_pool,submit_shared
+import pandas as pd
+import urllib.parse
+import asyncio
+import time
+import json
+import os
+
+#Long running service that keeps a DailyProjection's player stats, features, fitted models, and projections loaded
+#and serves them over a local http api instead of reloading every file for each request
+#Reads are answered from memory, re-projecting after a player pool update runs in a pool of worker processes so reads stay fast
+#Workers are forked after the state is loaded so they start with the player stats and models already in memory
+#Endpoints:
+#   GET /projections                 today's projections, optionally filtered with ?position=G or ?team=WPG
+#   GET /players/{name}/features     one player's features and projection
+#   GET /status                      date, version, and when the projections were last updated
+#   POST /reproject                  re-projects after the player pool file changes and returns the players that changed
+class ProjectionService:
+    def __init__(self,daily_projection,host='127.0.0.1',port=8050,workers=1,run_daily=False):
+        self.dp = daily_projection
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.run_daily = run_daily
+        self.date = self.dp.date.strftime('%y_%m_%d')
+        self.feat_file = f"{self.dp.feat_path}/{self.date}.csv"
+        self.proj_file = f"{self.dp.proj_path}/{self.date}.csv"
+        self.engine = None
+        self.features = None
+        self.projections = None
+        self.projection_bytes = None
+        self.version = 0
+        self.updated = None
+        self.pool = None
+        self.lock = None
+
+    #Loads everything that requests need, running today's projections first if run_daily or if there aren't any yet
+    def load(self):
+        with self.dp.run_log.stage('service_load',self.dp.date):
+            if self.run_daily:
+                self.dp.export_todays_projections()
+            self.dp.load_player_stats()
+            if not (self.dp.storage.exists(self.feat_file) and os.path.exists(self.proj_file)):
+                self.dp.reproject_pool()
+            projection = Projection(self.dp.feat_file,self.feat_file,self.dp.storage,self.dp.model_cache)
+            self.engine = projection.engine(self.dp.f_list,self.dp.d_list,self.dp.g_list)
+            self.refresh()
+
+    #Reads today's feature and projection files into memory and serializes the full projections once for polling
+    def refresh(self):
+        self.features = self.dp.storage.read(self.feat_file).set_index('name')
+        self.projections = pd.read_csv(self.proj_file)
+        self.version += 1
+        self.updated = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.projection_bytes = json.dumps(self.projection_payload(self.projections)).encode()
+
+    def projection_payload(self,df):
+        return {'date':self.date,'version':self.version,'updated':self.updated,'projections':self.records(df)}
+
+    #Helper function that turns a df into a list of dicts with NaN as null
+    def records(self,df):
+        return json.loads(df.to_json(orient='records',double_precision=15))
+
+    def get_projections(self,query):
+        if not query:
+            return 200,self.projection_bytes
+        df = self.projections
+        for col in ['position','team']:
+            if col in query:
+                df = df[df[col]==query[col]]
+
+        return 200,self.projection_payload(df)
+
+    def get_player_features(self,name):
+        if name not in self.features.index:
+            return 404,{'error':f'{name} is not in the player pool for {self.date}'}
+        features = self.features.loc[[name]].reset_index()
+        projection = self.projections[self.projections['name']==name]
+
+        return 200,{'date':self.date,'version':self.version,'features':self.records(features),'projections':self.records(projection)}
+
+    def get_status(self):
+        return 200,{'date':self.date,'version':self.version,'updated':self.updated,'players':len(self.projections)}
+
+    #Re-projects the player pool in a worker with the loaded models, then reloads the new files
+    #Only one re-projection runs at a time, requests that come in meanwhile wait for it and run after it
+    async def reproject(self):
+        async with self.lock:
+            start = time.perf_counter()
+            record = {'stage':'service_reproject','date':self.dp.date,'status':'ok','rows':None}
+            try:
+                changes = await asyncio.wrap_future(submit_shared(self.pool,'reproject_pool',self.engine))
+                self.refresh()
+                record['rows'] = len(changes)
+            except Exception as e:
+                record['status'] = 'error'
+                record['error'] = f'{type(e).__name__}: {e}'
+            record['seconds'] = time.perf_counter()-start
+            self.dp.run_log.add(record)
+            if record['status'] == 'error':
+                return 500,{'error':record['error']}
+
+            return 200,{'date':self.date,'version':self.version,'seconds':record['seconds'],'changes':self.records(changes.reset_index(names='name'))}
+
+    #Matches a request to an endpoint and returns the status and payload (a dict or already encoded bytes)
+    async def route(self,method,target):
+        url = urllib.parse.urlsplit(target)
+        parts = [urllib.parse.unquote(p) for p in url.path.strip('/').split('/')]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if method == 'GET' and parts == ['projections']:
+            return self.get_projections(query)
+        if method == 'GET' and len(parts) == 3 and parts[0] == 'players' and parts[2] == 'features':
+            return self.get_player_features(parts[1])
+        if method == 'GET' and parts == ['status']:
+            return self.get_status()
+        if method == 'POST' and parts == ['reproject']:
+            return await self.reproject()
+
+        return 404,{'error':f'no endpoint for {method} {url.path}'}
+
+    #Helper function that builds an http response with a json body
+    def response(self,status,payload,keep_alive):
+        body = payload if isinstance(payload,bytes) else json.dumps(payload).encode()
+        reason = {200:'OK',400:'Bad Request',404:'Not Found',500:'Internal Server Error'}[status]
+        headers = [
+            f'HTTP/1.1 {status} {reason}',
+            'Content-Type: application/json',
+            f'Content-Length: {len(body)}',
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+
+        return ('\r\n'.join(headers)+'\r\n\r\n').encode()+body
+
+    #Handles the requests on one connection, connections are kept open between requests unless the client asks to close them
+    #Errors from an endpoint are answered with a 500 and a json error so the connection and other requests aren't affected
+    async def handle(self,reader,writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if not header.strip():
+                        break
+                    key,_,value = header.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length',0))
+                if length:
+                    await reader.readexactly(length)
+                request = line.decode('latin-1').split()
+                keep_alive = len(request) == 3 and request[2] == 'HTTP/1.1' and headers.get('connection','').lower() != 'close'
+                if len(request) != 3:
+                    status,payload = 400,{'error':'malformed request line'}
+                else:
+                    try:
+                        status,payload = await self.route(request[0],request[1])
+                    except Exception as e:
+                        status,payload = 500,{'error':f'{type(e).__name__}: {e}'}
+                writer.write(self.response(status,payload,keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError,asyncio.IncompleteReadError,ValueError):
+            pass
+        finally:
+            writer.close()
+
+    #Loads the state, starts the worker pool, and serves requests until stopped
+    async def serve(self):
+        self.load()
+        self.lock = asyncio.Lock()
+        self.pool = shared_pool(self.dp,self.workers)
+        server = await asyncio.start_server(self.handle,self.host,self.port)
+        print(f'Serving projections for {self.date} at http://{self.host}:{self.port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown()
+
+    def run(self):
+        asyncio.run(self.serve())
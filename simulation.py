@@ -0,0 +1,195 @@
+import pandas as pd
+import numpy as np
+from feature import Feature
+from scoring import Scoring
+from storage import Storage
+
+#Class that simulates every player's game on a slate many times to get a distribution of FP instead of a single projection
+#Each player's TOI and per 60 event rates are fit from their last sample_size games and regressed to the league average like Feature.regressed_mean
+#Skater events are Poisson draws with rates multiplied by gamma shocks shared by a team, its lines, and its power play units
+#so line mates boom and bust together, team_shape and line_shape are the gamma shapes (variance of a shock is 1/shape)
+#Goalies face Poisson shots scaled by the opposing team's shock, save them with binomial draws at their save percentage,
+#and win by outscoring a Poisson draw of their team's implied score, with ties going to implied_win_prob
+#Draws are scored with the same Scoring table as GameStats so simulated FP match how the history was scored
+class Simulation:
+    def __init__(self,stats_file,player_pool_path,scoring_table='fanduel',storage=None,sample_size=30,regression_scalar=.75,team_shape=25,line_shape=10,seed=None):
+        self.storage = storage if storage else Storage()
+        self.feature = Feature(None,player_pool_path,self.storage)
+        self.scoring = Scoring(scoring_table)
+        self.sample_size = sample_size
+        self.regression_scalar = regression_scalar
+        self.team_shape = team_shape
+        self.line_shape = line_shape
+        self.rng = np.random.default_rng(seed)
+        self.strengths = ['ev','pp','pk']
+        self.events = ['G','A','SH','BkS']
+        self.positions = {'L':'F','C':'F','R':'F','W':'F','D':'D','G':'G'}
+        columns = ['date','name','position','TOI']+[s+stat for s in self.strengths for stat in ['TOI']+self.events]+['SA','SV']
+        self.stats = self.storage.read(stats_file,columns).sort_values('date',kind='stable')
+
+    #Regresses each pool player's parameters toward the GP weighted average of the players in their position group
+    #scalars is the regression scalar of each parameter, 1 for parameters like save percentage that shouldn't be pulled toward 0
+    #Players without games or without a value for a parameter get the league average for it
+    def regress(self,params,gp,group,pool_group,scalars):
+        n = self.sample_size
+        out = pd.DataFrame(index=pool_group.index,columns=params.columns,dtype='float64')
+        for g in pool_group.unique():
+            hist = params[group==g]
+            w = gp[group==g]
+            league = hist.mul(w,axis=0).sum()/hist.notna().mul(w,axis=0).sum()
+            names = pool_group.index[pool_group==g]
+            x = params.reindex(names).fillna(league).to_numpy(dtype='float64')
+            p_gp = np.minimum(gp.reindex(names).fillna(0).to_numpy(dtype='float64'),n)[:,None]
+            sc = np.array([scalars.get(c,self.regression_scalar) for c in params.columns])
+            out.loc[names] = (p_gp*x + sc*(n-p_gp)*league.to_numpy(dtype='float64'))/n
+
+        return out
+
+    #Fits TOI and event rate parameters from each player's last sample_size games before the date
+    #Skaters get the mean and standard deviation of their TOI and per 60 rates of each event in each strength state
+    #Goalies get shots against per 60, save percentage, and how often they're pulled (less than pull_minutes played)
+    #Returns dfs of parameters for the skaters and goalies in the player pool
+    def fit(self,date,skater_pool,goalie_pool,pull_minutes=50):
+        hist = self.stats[self.stats['date'] < date.strftime('%y_%m_%d')]
+        last = hist.groupby('name').tail(self.sample_size)
+        groups = last.groupby('name')
+        sums = groups.sum(numeric_only=True)
+        gp = groups.size()
+        group = groups['position'].last().map(self.positions)
+        pool_group = lambda pool: pool['position'].map(self.positions)
+
+        skaters = {}
+        for s in self.strengths:
+            skaters[f'{s}TOI_mean'] = groups[s+'TOI'].mean()
+            skaters[f'{s}TOI_sd'] = groups[s+'TOI'].std(ddof=0)
+            for stat in self.events:
+                skaters[f'{s}{stat}/60'] = (sums[s+stat]/sums[s+'TOI']*60).where(sums[s+'TOI']>0)
+        skaters = pd.DataFrame(skaters)
+        #TOI spreads and save percentages are kept at their own scale, means and rates are regressed like Feature.regressed_mean
+        sd_scalars = {f'{s}TOI_sd':1 for s in self.strengths}
+        skaters = self.regress(skaters,gp,group,pool_group(skater_pool),sd_scalars)
+
+        goalies = pd.DataFrame({
+            'SA/60':(sums['SA']/sums['TOI']*60).where(sums['TOI']>0),
+            'SV_pct':(sums['SV']/sums['SA']).where(sums['SA']>0),
+            'pull':(last['TOI'] < pull_minutes).groupby(last['name']).mean(),
+        })
+        goalies = self.regress(goalies,gp,group,pool_group(goalie_pool),{'SV_pct':1,'pull':1})
+
+        return skaters,goalies
+
+    #Helper function that draws gamma distributed values with the given means and standard deviations
+    #Values without a spread are kept at their mean
+    def draw_gamma(self,mean,sd,size):
+        valid = (mean>0) & (sd>0)
+        shape = np.where(valid,mean**2/np.where(valid,sd,1)**2,1)
+        scale = np.where(valid,sd**2/np.where(valid,mean,1),0)
+        return np.where(valid,self.rng.gamma(shape,scale,size),mean)
+
+    #Helper function that draws mean 1 gamma shocks for each key, with a last column of 1s for players without a key (index -1)
+    def draw_shocks(self,shape,keys,size):
+        shocks = self.rng.gamma(shape,1/shape,(size,keys+1))
+        shocks[:,-1] = 1
+
+        return shocks
+
+    #Helper function that turns team and line columns into integer keys, rows without a line get -1
+    def line_keys(self,pool,line_col,by_group=False):
+        line = pool[line_col]
+        keys = pool['team']+'_'+(pool['position'].map(self.positions)+'_' if by_group else '')+line.astype(str)
+        codes,uniques = pd.factorize(keys.where(line.notna()))
+
+        return codes,len(uniques)
+
+    #Simulates n games of every skater and goalie in the date's player pool and returns each draw's FP as a (n,players) array
+    #Also returns the pool rows in the same order as the columns, draws are made in chunks of chunk_size to limit memory
+    def simulate_fp(self,date,n=10000,chunk_size=2000):
+        player_pool = self.feature.get_player_pool(f"{self.feature.player_pool_path}/DFF_NHL_cheatsheet_{date.strftime('%Y-%m-%d')}.csv")
+        skater_pool,goalie_pool = player_pool['S'],player_pool['G']
+        skaters,goalies = self.fit(date,skater_pool,goalie_pool)
+
+        #Teams, lines, and power play units that share shocks
+        teams,team_names = pd.factorize(pd.concat([skater_pool['team'],goalie_pool['team'],goalie_pool['opp']]))
+        team_idx = teams[:len(skater_pool)]
+        goalie_team = teams[len(skater_pool):len(skater_pool)+len(goalie_pool)]
+        goalie_opp = teams[len(skater_pool)+len(goalie_pool):]
+        ev_line,n_ev = self.line_keys(skater_pool,'reg_line',by_group=True)
+        pp_line,n_pp = self.line_keys(skater_pool,'pp_line')
+        implied_score = goalie_pool['implied_team_score'].to_numpy(dtype='float64')
+        win_prob = Feature.implied_win_prob(implied_score,goalie_pool['over_under'].to_numpy(dtype='float64'))
+        param = lambda df,col: df[col].to_numpy(dtype='float64')
+
+        fp = np.empty((n,len(skater_pool)+len(goalie_pool)))
+        for start in range(0,n,chunk_size):
+            m = min(chunk_size,n-start)
+            team_shock = self.draw_shocks(self.team_shape,len(team_names),m)
+            shocks = {
+                'ev':team_shock[:,team_idx]*self.draw_shocks(self.line_shape,n_ev,m)[:,ev_line],
+                'pp':team_shock[:,team_idx]*self.draw_shocks(self.line_shape,n_pp,m)[:,pp_line],
+                'pk':1,
+            }
+
+            #Skaters, blocked shots are defensive so they don't share their line's scoring shock
+            skater_fp = 0
+            for s in self.strengths:
+                toi = self.draw_gamma(param(skaters,f'{s}TOI_mean'),param(skaters,f'{s}TOI_sd'),(m,len(skater_pool)))
+                counts = {}
+                for stat in self.events:
+                    lam = param(skaters,f'{s}{stat}/60')*toi/60
+                    counts[stat] = self.rng.poisson(lam if stat == 'BkS' else lam*shocks[s])
+                skater_fp = skater_fp+self.scoring.fp(s,counts)
+            fp[start:start+m,:len(skater_pool)] = skater_fp
+
+            #Goalies, a pulled goalie plays a uniform share of the middle of the game and can't win
+            pulled = self.rng.random((m,len(goalie_pool))) < param(goalies,'pull')
+            toi = np.where(pulled,self.rng.uniform(15,45,(m,len(goalie_pool))),60)
+            sa = self.rng.poisson(param(goalies,'SA/60')*toi/60*team_shock[:,goalie_opp])
+            sv = self.rng.binomial(sa,param(goalies,'SV_pct'))
+            ga = sa-sv
+            goals = self.rng.poisson(implied_score*team_shock[:,goalie_team])
+            tie_win = self.rng.random((m,len(goalie_pool))) < win_prob
+            win = ~pulled & ((goals > ga) | ((goals == ga) & tie_win))
+            so = win & (ga == 0)
+            fp[start:start+m,len(skater_pool):] = self.scoring.fp('goalie',{'SV':sv,'GA':ga,'win':win,'SO':so})
+
+        return fp,pd.concat([skater_pool,goalie_pool])
+
+    #Simulates the date's slate and returns each player's mean, standard deviation, percentiles, and boom probability of FP
+    #Boom is scoring at least boom_value FP per $1000 of salary
+    #projections is an optional df with a proj_FP column indexed by name (like ProjectionEngine.project's output),
+    #each player's draws are calibrated to have the projection as their mean, skaters by scaling and goalies by shifting since their FP can be negative
+    def simulate(self,date,n=10000,projections=None,boom_value=4,percentiles=(10,50,90),chunk_size=2000):
+        fp,pool = self.simulate_fp(date,n,chunk_size)
+        sim_mean = fp.mean(axis=0)
+        if projections is not None:
+            proj = projections.reset_index().drop_duplicates('name').set_index('name')['proj_FP'].reindex(pool.index).to_numpy(dtype='float64')
+            goalie = (pool['position']=='G').to_numpy()
+            scale = np.where(~goalie & (sim_mean>0) & ~np.isnan(proj),proj/np.where(sim_mean>0,sim_mean,1),1)
+            shift = np.where(goalie & ~np.isnan(proj),proj-sim_mean,0)
+            fp = fp*scale+shift
+
+        salary = pool['salary'].to_numpy(dtype='float64')
+        df = pool[['position','team','opp','salary']].copy()
+        if projections is not None:
+            df['proj_FP'] = proj
+        df['sim_mean'] = fp.mean(axis=0)
+        df['sim_sd'] = fp.std(axis=0)
+        for p,values in zip(percentiles,np.percentile(fp,percentiles,axis=0)):
+            df[f'p{p}'] = values
+        df['boom_prob'] = (fp >= boom_value*salary/1000).mean(axis=0)
+        df['date'] = date.strftime('%y_%m_%d')
+        df = df.reset_index().set_index(['date','name','position'])
+
+        return df.sort_values('sim_mean',ascending=False)
+
+    '''
+    BE CAREFUL WITH THIS FUNCTION
+    WILL OVERWRITE EXISTING FILES
+    '''
+
+    #Simulates the date's slate and exports the distributions to a csv, returns the df
+    def export_simulation(self,date,file_name,**sim_args):
+        df = self.simulate(date,**sim_args)
+        df.to_csv(file_name)
+
+        return df
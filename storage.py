@@ -0,0 +1,102 @@
+import pandas as pd
+import numpy as np
+import os
+
+#Class that reads and writes the stats, feature, and projection dfs in either csv or a typed columnar format
+#File names are always given with a .csv extension, the storage swaps in the extension of its own format
+#so the same paths work no matter which format is used
+#Parquet and feather need pyarrow installed
+class Storage:
+    extensions = {'csv':'csv','parquet':'parquet','feather':'feather'}
+
+    def __init__(self,fmt='csv'):
+        if fmt not in self.extensions:
+            raise ValueError(f"Unknown storage format {fmt}, use one of {list(self.extensions)}")
+        if fmt != 'csv':
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError(f"pyarrow is needed to use {fmt} storage")
+        self.fmt = fmt
+
+    #Returns the file name with the extension used by this storage format
+    def path(self,file_name):
+        return f"{os.path.splitext(file_name)[0]}.{self.extensions[self.fmt]}"
+
+    def exists(self,file_name):
+        return os.path.exists(self.path(file_name))
+
+    #Lists the daily files in a folder that are stored in this format and are before the max date, in date order
+    def list_files(self,path_name,max_date):
+        ext = '.'+self.extensions[self.fmt]
+        return sorted(file for file in os.listdir(path_name) if file < max_date.strftime('%y_%m_%d') and file.endswith(ext))
+
+    #Reads a file into a df with a default index, any index written with the file comes back as columns
+    #columns limits which columns are read, date_range is an inclusive (start, end) tuple of yy_mm_dd strings
+    #Parquet files skip row groups outside the date range, other formats filter after reading
+    #csv_args are passed on to read_csv and ignored by the other formats
+    def read(self,file_name,columns=None,date_range=None,**csv_args):
+        if columns is not None and date_range is not None and 'date' not in columns:
+            columns = ['date']+list(columns)
+        if self.fmt == 'csv':
+            df = pd.read_csv(self.path(file_name),usecols=columns,low_memory=False,**csv_args)
+        elif self.fmt == 'parquet':
+            filters = [('date','>=',date_range[0]),('date','<=',date_range[1])] if date_range is not None else None
+            df = pd.read_parquet(self.path(file_name),columns=columns,filters=filters)
+        else:
+            df = pd.read_feather(self.path(file_name),columns=columns)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        if date_range is not None and self.fmt != 'parquet':
+            df = df[(df['date']>=date_range[0]) & (df['date']<=date_range[1])].reset_index(drop=True)
+
+        return df
+
+    '''
+    BE CAREFUL WITH THIS FUNCTION
+    WILL OVERWRITE EXISTING FILES
+    '''
+    #Writes a df with its index, parquet files are written with one row group per date so reads can be pruned by date
+    def write(self,df,file_name):
+        if self.fmt == 'csv':
+            df.to_csv(self.path(file_name))
+            return
+        df = self.typed(df.reset_index() if any(df.index.names) else df)
+        if self.fmt == 'parquet':
+            if 'date' in df.columns:
+                df = df.sort_values('date',kind='stable').reset_index(drop=True)
+                sizes = df.groupby('date',sort=False).size()
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(df,preserve_index=False)
+                with pq.ParquetWriter(self.path(file_name),table.schema) as writer:
+                    start = 0
+                    for size in sizes:
+                        writer.write_table(table.slice(start,size))
+                        start += size
+            else:
+                df.to_parquet(self.path(file_name),index=False)
+        else:
+            df.to_feather(self.path(file_name))
+
+    #Converts text columns that only hold numbers and Natural Stat Trick's '-' placeholder to floats
+    #so every day's file has the same column types and can be concatenated
+    #Other object columns are made all text, like the 0 team and position get_day_stats fills in for players only in the pp or pk files,
+    #which is how they'd read back from a csv
+    def typed(self,df):
+        df = df.copy()
+        for col in df.columns:
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                s = df[col].replace('-',np.nan)
+                num = pd.to_numeric(s,errors='coerce')
+                if num.notna().sum() == s.notna().sum() and num.notna().any():
+                    df[col] = num
+                elif df[col].dtype == object:
+                    df[col] = df[col].astype('str')
+
+        return df
+
+    #Writes a csv copy of a file stored in this format, for sharing or opening in a spreadsheet
+    def export_csv(self,file_name,csv_file=None):
+        csv_file = csv_file if csv_file else os.path.splitext(file_name)[0]+'.csv'
+        self.read(file_name).to_csv(csv_file,index=False)
@@ -0,0 +1,218 @@
+import pandas as pd
+import numpy as np
+import datetime as dt
+import csv
+import os
+from game_stats import MASCOTS,CITIES
+
+#Column headers of the Natural Stat Trick and Daily Fantasy Fuel files the pipeline reads
+NST_COLUMNS = [
+    'Player','Team','Position','GP','TOI','Goals','Total Assists','First Assists','Second Assists','Total Points','IPP','Shots','SH%',
+    'ixG','iCF','iFF','iSCF','iHDCF','Rush Attempts','Rebounds Created','PIM','Total Penalties','Minor','Major','Misconduct',
+    'Penalties Drawn','Giveaways','Takeaways','Hits','Hits Taken','Shots Blocked','Faceoffs Won','Faceoffs Lost','Faceoffs %'
+]
+NST_GOALIE_COLUMNS = [
+    'Player','Team','GP','TOI','Shots Against','Saves','Goals Against','SV%','GAA','GSAA','xG Against','HD Shots Against','HD Saves',
+    'HD Goals Against','HDSV%','HDGAA','HDGSAA','MD Shots Against','MD Saves','MD Goals Against','MDSV%','MDGAA','MDGSAA',
+    'LD Shots Against','LD Saves','LD Goals Against','LDSV%','LDGAA','LDGSAA','Rush Attempts Against','Rebound Attempts Against',
+    'Avg. Shot Distance','Avg. Goal Distance'
+]
+GAME_COLUMNS = ['Game','Team','','TOI','SF','SA','GF','GA']
+DFF_COLUMNS = [
+    'first_name','last_name','position','injury_status','reg_line','pp_line','starting_goalie','game_date','slate','team','opp',
+    'spread','over_under','implied_team_score','salary','L5_dvp_rank','L5_ppg_floor','L5_ppg_avg','L5_ppg_max','ppg_projection',
+    'value_projection','ppg_actual','value_actual'
+]
+
+#Per 60 minute rates of goals, assists, shots, and blocks for forwards and defenders at each strength
+RATES = {
+    'ev':{'F':[.8,1.1,7.5,1.5],'D':[.25,.8,4.5,4.0]},
+    'pp':{'F':[2.5,4.0,15.0,.3],'D':[1.0,4.0,12.0,.3]},
+    'pk':{'F':[.3,.3,2.5,6.0],'D':[.1,.3,1.5,9.0]},
+}
+
+#Class that writes a synthetic history of NST style ev, pp, pk, and goalie game stats, game_info home and away files,
+#and DFF player pools into path in the same layout as the real data so the whole pipeline can run on it
+#Each team has 4 forward lines, 3 defense pairs, and 2 goalies whose talent carries over between games and seasons
+#Each season starts on October 2nd and every team plays about games_per_team games over season_days days
+class SyntheticSeason:
+    def __init__(self,path,seasons=1,n_teams=31,games_per_team=82,season_days=182,first_season=2019,seed=0):
+        self.path = path
+        self.seasons = seasons
+        self.n_teams = min(n_teams,len(CITIES))
+        self.games_per_team = games_per_team
+        self.season_days = season_days
+        self.first_season = first_season
+        self.rng = np.random.default_rng(seed)
+        self.roster = self.get_roster()
+        self.strength = pd.Series(self.rng.normal(0,.1,self.n_teams),CITIES[:self.n_teams])
+
+    #Paths of each input folder, in the form of the arguments DailyProjection takes
+    def paths(self):
+        names = {
+            'ev_path':'ev_game_stats','pp_path':'pp_game_stats','pk_path':'pk_game_stats','goalie_path':'goalie_stats','game_path':'game_info',
+            'player_pool_path':'player_pool','stats_path':'daily_game_stats','feat_path':'daily_features_last30','proj_path':'projections_last30'
+        }
+        return {key:f"{self.path}/{name}" for key,name in names.items()}
+
+    #Creates every team's players with their line, power play unit, penalty kill unit, and talent
+    def get_roster(self):
+        rows = []
+        for team in CITIES[:self.n_teams]:
+            code = team.replace('.','')
+            for line in range(1,5):
+                for pos in ['C','L','R']:
+                    rows.append([code,f'{pos}{line}',team,pos,line,{1:1,2:2}.get(line),line >= 3 and pos != 'R'])
+            for pair in range(1,4):
+                for n in range(2):
+                    rows.append([code,f'D{2*pair-1+n}',team,'D',pair,{(1,0):1,(2,0):2}.get((pair,n)),pair <= 2])
+            for n in range(1,3):
+                rows.append([code,f'G{n}',team,'G',1,None,False])
+        roster = pd.DataFrame(rows,columns=['first_name','last_name','team','position','reg_line','pp_line','pk'])
+        roster['pp_line'] = roster['pp_line'].astype('Int64')
+        roster['name'] = roster['first_name']+' '+roster['last_name']
+        roster['talent'] = self.rng.lognormal(0,.25,len(roster))
+        roster['group'] = np.where(roster['position']=='D','D',np.where(roster['position']=='G','G','F'))
+
+        return roster
+
+    #Returns the schedule as a list of (date, [(away, home), ...]) for each day with games
+    def get_schedule(self):
+        teams = np.array(CITIES[:self.n_teams])
+        games_per_day = self.n_teams*self.games_per_team/2/self.season_days
+        schedule = []
+        for season in range(self.seasons):
+            start = dt.date(self.first_season+season,10,2)
+            for day in range(self.season_days):
+                n = min(self.rng.poisson(games_per_day),self.n_teams//2)
+                if n:
+                    t = self.rng.permutation(teams)[:2*n]
+                    schedule.append((start+dt.timedelta(days=day),list(zip(t[::2],t[1::2]))))
+
+        return schedule
+
+    #Writes all files for every date in the schedule and returns the list of dates with games
+    def generate(self):
+        for folder in self.paths().values():
+            os.makedirs(folder,exist_ok=True)
+        home,away = [],[]
+        schedule = self.get_schedule()
+        for date,games in schedule:
+            pool = self.get_player_pool(date,games)
+            skaters,goalies,scores = self.get_day_stats(date,games,pool)
+            for strength in ['ev','pp','pk']:
+                self.write_nst(skaters[strength],NST_COLUMNS,f"{self.paths()[strength+'_path']}/{date.strftime('%y_%m_%d')}.csv")
+            self.write_nst(goalies,NST_GOALIE_COLUMNS,f"{self.paths()['goalie_path']}/{date.strftime('%y_%m_%d')}.csv")
+            self.write_dff(pool,f"{self.paths()['player_pool_path']}/DFF_NHL_cheatsheet_{date.strftime('%Y-%m-%d')}.csv")
+            home.append(scores.assign(Team=scores['home_name'],GF=scores['home_GF'],GA=scores['away_GF']))
+            away.append(scores.assign(Team=scores['away_name'],GF=scores['away_GF'],GA=scores['home_GF']))
+        for file,df in [('home.csv',home),('away.csv',away)]:
+            df = pd.concat(df,ignore_index=True)
+            df[''] = 'Limited ReportFull Report'
+            df['TOI'] = 60
+            df['SF'] = df['SA'] = 0
+            df[GAME_COLUMNS].to_csv(f"{self.paths()['game_path']}/{file}",index=False,quoting=csv.QUOTE_ALL,encoding='utf-8-sig')
+
+        return [date for date,_ in schedule]
+
+    #Creates the DFF player pool for a date's games with vegas lines from team strength, injuries, and starting goalies
+    def get_player_pool(self,date,games):
+        teams = pd.DataFrame([(a,h) for a,h in games]+[(h,a) for a,h in games],columns=['team','opp'])
+        teams['home'] = [False]*len(games)+[True]*len(games)
+        teams['over_under'] = np.tile(self.rng.choice([5.5,6.0,6.5],len(games)),2)
+        share = .5+(self.strength[teams['team']].to_numpy()-self.strength[teams['opp']].to_numpy())/2+np.where(teams['home'],.02,-.02)
+        teams['implied_team_score'] = (teams['over_under']*share.clip(.3,.7)).round(1)
+        teams['spread'] = np.where(share >= .5,'-1.5','+1.5')
+
+        pool = self.roster.merge(teams,on='team')
+        pool['injury_status'] = np.where(self.rng.random(len(pool)) < .02,'O','')
+        starter = np.where(self.rng.random(len(teams)) < .75,'G1','G2')
+        pool['starting_goalie'] = np.where(pool['last_name']==pool['team'].map(dict(zip(teams['team'],starter))),'YES','')
+        pool['salary'] = (np.where(pool['group']=='G',7000,np.where(pool['group']=='D',3500,4000))*pool['talent']/pool['reg_line']**.3).round(-2).clip(2500,9500).astype(int)
+        pool['ppg_projection'] = (pool['salary']/1000*1.8*pool['implied_team_score']/3+self.rng.normal(0,1,len(pool))).round(1)
+        pool['value_projection'] = (pool['ppg_projection']/pool['salary']*1000).round(2)
+        pool['game_date'] = date.strftime('%Y-%m-%d')
+        pool['slate'] = 'Main'
+        pool['position'] = pool['position'].replace({'L':'W','R':'W'})
+
+        return pool
+
+    #Simulates each player's stats at each strength and each starting goalie's stats for a date's games
+    #Returns dicts of NST style skater dfs by strength, the goalie df, and a df of game strings and scores
+    def get_day_stats(self,date,games,pool):
+        played = pool[(pool['injury_status']!='O') & ((pool['group']!='G') | (pool['starting_goalie']=='YES'))].reset_index(drop=True)
+        skater = played['group']!='G'
+        n = len(played)
+        off = np.exp(self.strength[played['team']].to_numpy())
+        line = played['reg_line'].to_numpy()
+        d = (played['group']=='D').to_numpy()
+        toi = {
+            'ev':np.where(d,np.array([0,21,18,15,0])[line],np.array([0,16,14,12,9])[line]),
+            'pp':np.array([0,3.0,1.2])[played['pp_line'].fillna(0).to_numpy(dtype=int)],
+            'pk':np.where(played['pk'],2.0,0),
+        }
+        skaters = {}
+        goals = np.zeros(n)
+        shots = np.zeros(n)
+        ixg = np.zeros(n)
+        for strength in ['ev','pp','pk']:
+            t = np.where(skater & (toi[strength] > 0),(toi[strength]+self.rng.normal(0,toi[strength]/8+.01,n)).clip(.5),0)
+            rates = np.where(d[:,None],RATES[strength]['D'],RATES[strength]['F'])
+            rates[:,:3] *= (played['talent'].to_numpy()*off)[:,None]
+            events = self.rng.poisson(rates*t[:,None]/60)
+            df = played[['name','team','position']].rename(columns={'name':'Player','team':'Team','position':'Position'})
+            df['Position'] = played['last_name'].str[0]
+            df['TOI'] = t
+            df['Goals'],df['Total Assists'],df['Shots'],df['Shots Blocked'] = events.T
+            df['Shots'] = np.maximum(df['Shots'],df['Goals'])
+            df['ixG'] = (df['Shots']*self.rng.uniform(.05,.15,n)+df['Goals']*.2).round(2)
+            keep = t > 0
+            goals += np.where(keep,df['Goals'],0)
+            shots += np.where(keep,df['Shots'],0)
+            ixg += np.where(keep,df['ixG'],0)
+            skaters[strength] = df[keep]
+
+        #Team totals decide the score, ties get an overtime goal added to a random forward of a random team
+        totals = pd.DataFrame({'team':played['team'],'G':goals,'SH':shots,'ixG':ixg}).groupby('team').sum()
+        rows = []
+        overtime = []
+        for a,h in games:
+            ga,gh = int(totals.loc[a,'G']),int(totals.loc[h,'G'])
+            if ga == gh:
+                winner = a if self.rng.random() < .5 else h
+                ev = skaters['ev']
+                scorer = self.rng.choice(ev.index[(ev['Team']==winner) & (ev['Position']!='D')])
+                skaters['ev'].loc[scorer,'Goals'] += 1
+                skaters['ev'].loc[scorer,'Shots'] += 1
+                totals.loc[winner,['G','SH']] += 1
+                ga,gh = (ga+1,gh) if winner == a else (ga,gh+1)
+                overtime += [a,h]
+            rows.append([a,h,ga,gh])
+        scores = pd.DataFrame(rows,columns=['away','home','away_GF','home_GF'])
+        mascots = dict(zip(CITIES,MASCOTS))
+        scores['away_name'] = scores['away'].map(mascots)
+        scores['home_name'] = scores['home'].map(mascots)
+        scores['Game'] = date.strftime('%Y-%m-%d')+' - '+scores['away_name']+' '+scores['away_GF'].astype(str)+', '+scores['home_name']+' '+scores['home_GF'].astype(str)
+
+        opp = pd.concat([scores.set_index('away')['home'],scores.set_index('home')['away']])
+        goalies = played.loc[~skater,['name','team','talent']].rename(columns={'name':'Player','team':'Team'})
+        shots_against = totals.loc[opp[goalies['Team']].to_numpy()]
+        goalies['TOI'] = 60+np.where(goalies['Team'].isin(overtime),self.rng.uniform(0,5,len(goalies)),0)
+        goalies['Goals Against'] = shots_against['G'].to_numpy().astype(int)
+        goalies['Shots Against'] = np.maximum(shots_against['SH'].to_numpy(),goalies['Goals Against']).astype(int)
+        goalies['Saves'] = goalies['Shots Against']-goalies['Goals Against']
+        goalies['SV%'] = (goalies['Saves']/goalies['Shots Against'].replace(0,1)).round(3)
+        goalies['GSAA'] = (goalies['Shots Against']*.092-goalies['Goals Against']).round(2)
+        goalies['xG Against'] = shots_against['ixG'].round(2).to_numpy()
+
+        return skaters,goalies,scores
+
+    #Writes a df in the layout NST exports use, with an unnamed row number column and every value quoted
+    def write_nst(self,df,columns,file_name):
+        df = df.reindex(columns=columns,fill_value=0)
+        df['GP'] = 1
+        df.index = range(1,len(df)+1)
+        df.to_csv(file_name,index_label='',quoting=csv.QUOTE_ALL,encoding='utf-8-sig')
+
+    def write_dff(self,pool,file_name):
+        pool.reindex(columns=DFF_COLUMNS).to_csv(file_name,index=False)
@@ -0,0 +1,5 @@
+import sys
+import os
+
+#Lets the tests import the top level modules when pytest is run from anywhere
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
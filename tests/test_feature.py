@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+from feature import Feature
+
+@pytest.fixture
+def feature():
+    return Feature(None,'player_pool')
+
+#Small means_per60 frame like regress_means builds, with a NaN stat, an inf stat, and a player with a full sample
+@pytest.fixture
+def means_per60():
+    return pd.DataFrame({
+        'evG/60':[1.0,.5,np.nan,.8,.2,.4],
+        'evSH/60':[8.0,6.0,7.0,np.inf,5.0,6.5],
+        'evBkS/60':[2.0,4.0,3.0,1.0,2.5,3.5],
+        'mean_TOI':[18.0,12.0,15.0,20.0,9.0,14.0],
+        'GP':[30,12,3,1,20,7],
+    },index=pd.Index(['A','B','C','D','E','F'],name='name'))
+
+#naive_regression_all should give every player the same stats as regressing them one at a time with naive_regression
+@pytest.mark.parametrize('players',[['A','B','C','D','E','F'],['B','E'],['D']])
+def test_naive_regression_all_matches_naive_regression(feature,means_per60,players):
+    result = feature.naive_regression_all(players,means_per60,30,.75)
+    expected = pd.DataFrame({p:feature.naive_regression(p,means_per60,30,.75) for p in players}).T
+
+    assert list(result.index) == players
+    np.testing.assert_allclose(result.to_numpy(),expected.loc[players,result.columns].to_numpy(dtype='float64'),rtol=1e-12)
+
+def test_naive_regression_all_finite_stats(feature,means_per60):
+    df = means_per60.drop(['C','D'])
+    result = feature.naive_regression_all(df.index,df,30,.75)
+    expected = pd.DataFrame({p:feature.naive_regression(p,df,30,.75) for p in df.index}).T
+
+    assert np.isfinite(result.to_numpy()).all()
+    np.testing.assert_allclose(result.to_numpy(),expected[result.columns].to_numpy(dtype='float64'),rtol=1e-12)
+
+#Hand built player pool split by position like Feature.get_player_pool
+#Team A: line 1 has two forwards on pp unit 1 and one without a pp unit, line 2's only mate has no stats,
+#one forward has no line, a defender is on pp unit 1, and a D pair of one. Team B's pp unit has a mate with a NaN stat
+@pytest.fixture
+def player_pool():
+    df = pd.DataFrame([
+        ('f1','C','A',1,1),('f2','W','A',1,1),('f3','W','A',1,np.nan),
+        ('f4','C','A',2,np.nan),('f5','W','A',2,np.nan),('f6','W','A',np.nan,np.nan),
+        ('d1','D','A',1,1),('d2','D','A',1,np.nan),('d3','D','A',2,np.nan),
+        ('f7','C','B',1,1),('f8','W','B',1,1),('d4','D','B',1,1),
+    ],columns=['name','position','team','reg_line','pp_line']).set_index('name')
+    return {
+        'F':df[df['position'].isin(['C','W'])],
+        'D':df[df['position']=='D'],
+        'S':df[df['position'].isin(['C','W','D'])],
+    }
+
+@pytest.fixture
+def stat_df():
+    stats = {'f1':.9,'f2':.6,'f3':.3,'f4':.5,'f6':.4,'d1':.2,'d2':.1,'d3':.15,'f7':.7,'f8':np.nan,'d4':.25}
+    return pd.DataFrame({'evixG/60':stats}).rename_axis('name')
+
+#The set based line mate calculation get_line_mate_stat replaced, with pp units made up of player_pool[pp_unit]
+#Missing lines give an empty set instead of failing so a player with no mates on their unit gets 0
+def set_based_line_mate_stat(player_pool,stat_df,stat,pp_unit):
+    def get_line(team,line,name,line_list):
+        if pd.isna(line) or not isinstance(line_list.loc[team,line],set):
+            return set()
+        return line_list.loc[team,line]-{name}
+
+    def line_mate_avg(lm,df,stat):
+        if not lm:
+            return 0
+        return pd.Series([df.loc[m,stat] for m in lm if m in df.index],dtype='float64').mean()
+
+    line_mates = player_pool['F'][['team','reg_line']].reset_index()
+    lines = line_mates.groupby(['team','reg_line'])['name'].apply(set).unstack()
+    d_partners = player_pool['D'][['team','reg_line']].reset_index()
+    d_pairs = d_partners.groupby(['team','reg_line'])['name'].apply(set).unstack()
+    pp_line_mates = player_pool['S'][['team','pp_line']].reset_index()
+    pp_lines = player_pool[pp_unit][['team','pp_line']].reset_index().groupby(['team','pp_line'])['name'].apply(set).unstack()
+
+    for df,line_col,line_list in [(line_mates,'reg_line',lines),(d_partners,'reg_line',d_pairs),(pp_line_mates,'pp_line',pp_lines)]:
+        df[stat] = df.apply(lambda x: line_mate_avg(get_line(x['team'],x[line_col],x['name'],line_list),stat_df,stat),axis=1)
+    lm = pd.concat([line_mates.set_index('name')[[stat]],d_partners.set_index('name')[[stat]]]).add_prefix('lm')
+
+    return lm.join(pp_line_mates.set_index('name')[[stat]].add_prefix('pplm'))
+
+@pytest.mark.parametrize('pp_unit',['F','S'])
+def test_line_mate_stat_matches_set_based(feature,player_pool,stat_df,pp_unit):
+    result = feature.get_line_mate_stat(player_pool,stat_df,'evixG/60',pp_unit).sort_index()
+    expected = set_based_line_mate_stat(player_pool,stat_df,'evixG/60',pp_unit).sort_index()
+
+    pd.testing.assert_frame_equal(result,expected,check_exact=False,rtol=1e-12)
+
+@pytest.mark.parametrize('pp_unit',['F','S'])
+def test_line_mate_stat_edge_cases(feature,player_pool,stat_df,pp_unit):
+    lm = feature.get_line_mate_stat(player_pool,stat_df,'evixG/60',pp_unit)
+
+    assert np.isnan(lm.loc['f4','lmevixG/60'])      #only line mate has no stats
+    assert lm.loc['f6','lmevixG/60'] == 0           #no line
+    assert lm.loc['d3','lmevixG/60'] == 0           #D pair of one
+    assert lm.loc['f3','pplmevixG/60'] == 0         #no pp unit
+    if pp_unit == 'F':
+        assert np.isnan(lm.loc['f7','pplmevixG/60'])    #only forward mate has a NaN stat
+    else:
+        assert lm.loc['f7','pplmevixG/60'] == pytest.approx(.25)
+    assert lm.loc['d4','pplmevixG/60'] == pytest.approx(.7)     #NaN stat of a mate is skipped
+
+#pp_unit 'F' only counts forwards as power play mates, 'S' counts defenders on the unit too
+def test_line_mate_stat_pp_unit(feature,player_pool,stat_df):
+    f = feature.get_line_mate_stat(player_pool,stat_df,'evixG/60','F')
+    s = feature.get_line_mate_stat(player_pool,stat_df,'evixG/60','S')
+
+    assert f.loc['f1','pplmevixG/60'] == pytest.approx(.6)
+    assert s.loc['f1','pplmevixG/60'] == pytest.approx((.6+.2)/2)
+    assert f.loc['d1','pplmevixG/60'] == pytest.approx((.9+.6)/2)
+    assert s.loc['d1','pplmevixG/60'] == pytest.approx((.9+.6)/2)
+
+#recency_weighted_mean takes sample_size and regression_scalar in the same order as regressed_mean, half_life only as a keyword,
+#group is a decay state snapshot of decayed means and GP
+def test_recency_weighted_mean_argument_order(feature):
+    means = pd.DataFrame({
+        'evG':[.3,.1,.2,.05],
+        'evSH':[2.5,1.2,1.8,.9],
+        'evTOI':[15.0,10.0,13.0,8.0],
+        'TOI':[18.0,12.0,15.0,9.0],
+        'GP':[12.0,5.0,2.0,1.0],
+    },index=pd.Index(['A','B','C','D'],name='name'))
+    player_pool = pd.DataFrame(index=means.index)
+    positional = feature.recency_weighted_mean(means,player_pool,30,.75)
+    keyword = feature.recency_weighted_mean(means,player_pool,regression_scalar=.75,sample_size=30)
+    half_life = feature.recency_weighted_mean(means,player_pool,None,.75,half_life=feature.get_half_life(sample_size=30))
+
+    pd.testing.assert_frame_equal(positional,keyword)
+    pd.testing.assert_frame_equal(positional,half_life)
+    assert not positional.equals(feature.recency_weighted_mean(means,player_pool,30,.5))
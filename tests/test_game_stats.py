@@ -0,0 +1,69 @@
+import datetime as dt
+import pandas as pd
+import pytest
+from game_stats import GameStats
+from storage import Storage
+
+DATES = [dt.date(2021,3,1),dt.date(2021,3,2)]
+
+#Writes NST style files for two dates with one game each (Jets at Canucks, then Canucks at Jets)
+#The first date has a goalie who faced no shots, so NST writes '-' for his SV%, the second date's goalies all have one
+#Skater s3 only played on the power play, so he isn't in the ev file
+@pytest.fixture
+def nst_path(tmp_path):
+    skater_cols = ['Player','Team','Position','TOI','Goals','Total Assists','Shots','Shots Blocked','ixG']
+    goalie_cols = ['Player','Team','TOI','Shots Against','Saves','Goals Against','SV%','GSAA','xG Against']
+    for folder in ['ev','pp','pk','goalie','game']:
+        (tmp_path/folder).mkdir()
+    for date in DATES:
+        d = date.strftime('%y_%m_%d')
+        pd.DataFrame([('s1','VAN','C',15.5,1,0,3,0,.4),('s2','WPG','D',20.0,0,1,1,2,.1)],columns=skater_cols).to_csv(tmp_path/'ev'/f'{d}.csv')
+        pd.DataFrame([('s1','VAN','C',2.0,0,1,1,0,.2),('s3','WPG','W',1.5,1,0,2,0,.3)],columns=skater_cols).to_csv(tmp_path/'pp'/f'{d}.csv')
+        pd.DataFrame([('s2','WPG','D',2.5,0,0,0,1,0)],columns=skater_cols).to_csv(tmp_path/'pk'/f'{d}.csv')
+        goalies = [('g1','VAN',60.0,30,28,2,'.933',1.1,2.5)]
+        goalies += [('g2','WPG',40.0,20,17,3,'.850',-1.0,2.0),('g3','WPG',20.0,0,0,0,'-',0.0,0.0)] if date == DATES[0] else [('g2','WPG',60.0,25,23,2,'.920',.5,2.2)]
+        pd.DataFrame(goalies,columns=goalie_cols).to_csv(tmp_path/'goalie'/f'{d}.csv')
+    games = ['2021-03-01 - Jets 3, Canucks 2','2021-03-02 - Canucks 1, Jets 4']
+    pd.DataFrame({'Game':games,'Team':['Vancouver Canucks','Winnipeg Jets']}).to_csv(tmp_path/'game'/'home.csv',index=False)
+    pd.DataFrame({'Game':games,'Team':['Winnipeg Jets','Vancouver Canucks']}).to_csv(tmp_path/'game'/'away.csv',index=False)
+
+    return tmp_path
+
+@pytest.fixture
+def game_stats(nst_path):
+    return GameStats(*[str(nst_path/folder) for folder in ['ev','pp','pk','goalie','game']])
+
+#A date whose goalie file has a '-' SV% is combined on its own, and gives the same rows as in a batch with a date that doesn't
+def test_day_stats_with_text_sv_pct(game_stats):
+    day = game_stats.get_day_stats(DATES[0])
+    batch = game_stats.combine_day_files({date:game_stats.read_day_files(date) for date in DATES})
+
+    assert len(day) == 6
+    assert day.xs('g3',level='name')['SV%'].iloc[0] == '-'
+    pd.testing.assert_frame_equal(day,batch.loc[[DATES[0].strftime('%y_%m_%d')]],check_dtype=False)
+    assert (batch.xs(DATES[1].strftime('%y_%m_%d'),level='date',drop_level=False)['SV%'].iloc[:3] == 0.0).all()
+
+#Writing the range one date at a time on workers and in batches gives every date either way
+@pytest.mark.parametrize('workers',[1,2])
+def test_write_daily_stats_range_text_sv_pct(game_stats,tmp_path,workers):
+    out = tmp_path/'out'
+    out.mkdir()
+    problems = game_stats.write_daily_stats_range(str(out),DATES[0],DATES[1],workers=workers)
+
+    assert problems == {}
+    assert sorted(f.name for f in out.iterdir()) == [f"{date.strftime('%y_%m_%d')}.csv" for date in DATES]
+
+#s3 only played on the power play so get_day_stats fills his team and position with 0,
+#typed columnar formats store them as text and read back the same as a csv does once its SV% is typed
+@pytest.mark.parametrize('fmt',['parquet','feather'])
+def test_day_stats_storage_round_trip(game_stats,tmp_path,fmt):
+    pytest.importorskip('pyarrow')
+    df = game_stats.get_day_stats(DATES[0])
+    storage = Storage(fmt)
+    storage.write(df,str(tmp_path/'stats.csv'))
+    Storage().write(df,str(tmp_path/'stats.csv'))
+    result = storage.read(str(tmp_path/'stats.csv'))
+    expected = storage.typed(Storage().read(str(tmp_path/'stats.csv')))
+
+    assert result.loc[result['name']=='s3',['team','position']].values.tolist() == [['0','0']]
+    pd.testing.assert_frame_equal(result,expected,check_dtype=False)
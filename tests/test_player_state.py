@@ -0,0 +1,42 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from player_state import PlayerStateCache
+
+STATS_LIST = ['evG','evTOI']
+
+#Position dfs like Feature.stats with two dates of games for one player in each group
+@pytest.fixture
+def stats():
+    index = pd.MultiIndex.from_tuples([('21_03_01','p'),('21_03_02','p')],names=['date','name'])
+    df = pd.DataFrame({'evG':[1.0,0.0],'evTOI':[15.0,12.0]},index=index)
+    return {'F':df,'D':df,'G':df}
+
+#Files whose hash changed or that are gone since they were added are found, and the hashes are saved and loaded with the buffers
+def test_changed_files(stats,tmp_path):
+    hashes = {'21_03_01.csv':'a','21_03_02.csv':'b'}
+    cache = PlayerStateCache(str(tmp_path/'state.npz'),STATS_LIST,30)
+    cache.rebuild(stats,hashes)
+    cache.save()
+    loaded = PlayerStateCache(str(tmp_path/'state.npz'),STATS_LIST,30)
+
+    assert loaded.load()
+    assert loaded.changed_files(hashes) == []
+    assert loaded.changed_files({**hashes,'21_03_03.csv':'c'}) == []
+    assert loaded.changed_files({**hashes,'21_03_02.csv':'x'}) == ['21_03_02.csv']
+    assert loaded.changed_files({'21_03_02.csv':'b'}) == ['21_03_01.csv']
+
+#A cache saved before file hashes were kept can't be checked for changed files, so load turns it down to be rebuilt
+def test_load_without_hashes(stats,tmp_path):
+    cache = PlayerStateCache(str(tmp_path/'state.npz'),STATS_LIST,30)
+    cache.rebuild(stats,{'21_03_01.csv':'a'})
+    cache.save()
+    with np.load(tmp_path/'state.npz') as data:
+        arrays = dict(data)
+    meta = json.loads(str(arrays['meta']))
+    del meta['hashes']
+    arrays['meta'] = np.array(json.dumps(meta))
+    np.savez(tmp_path/'state.npz',**arrays)
+
+    assert not PlayerStateCache(str(tmp_path/'state.npz'),STATS_LIST,30).load()